@@ -0,0 +1,171 @@
+"""
+Batch engine: Area, Health, Height and Density for many images with a few large array
+operations instead of a dozen small OpenCV / numpy calls per image.
+
+N frames are decoded (at 1/reduce size by libjpeg, in parallel threads) straight into one
+preallocated contiguous (N, H, W, 3) array that is reused for every batch. The whole batch is
+then handled as one tall (N*H, W) image: one cvtColor to HSV, one inRange per colour, and the
+per-frame reductions (pixel counts, topmost green row) as numpy reductions over axis 1 and 2.
+Frames of a different size are resized into their slot; metrics are scaled back to the
+original resolution so they are comparable with analyze.py.
+
+Usage:  python batch.py [--img img] [--batch 16] [--reduce 4] [--workers 4] [--csv out.csv] [--compare]
+--compare also runs the per-file loop of analyze.py and prints both speeds in frames per second.
+"""
+import os
+import csv
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from analyze import analyze_image, lower_green, upper_green, lower_yellow, upper_yellow
+from frames import capture_key
+
+_REDUCED = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+            4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+class BatchEngine:
+    """
+    Reusable buffers for batches of up to batch_size frames of size (width, height).
+    The frame size defaults to the reduced size of the first image seen.
+    """
+
+    def __init__(self, batch_size=16, reduce=4, size=None, workers=4):
+        if reduce not in _REDUCED:
+            raise ValueError("reduce must be 1, 2, 4 or 8")
+        self.batch_size = batch_size
+        self.reduce = reduce
+        self.size = size
+        self.workers = workers
+        self.frames = None    # (N, H, W, 3) BGR
+        self.hsv = None       # same shape, HSV
+        self.green = None     # (N*H, W) masks
+        self.yellow = None
+        self._scale = np.ones((batch_size, 2))   # original / slot size (x, y) per frame
+
+    def _allocate(self, width, height):
+        n = self.batch_size
+        self.frames = np.empty((n, height, width, 3), np.uint8)
+        self.hsv = np.empty_like(self.frames)
+        self.green = np.empty((n * height, width), np.uint8)
+        self.yellow = np.empty_like(self.green)
+
+    def _decode(self, i, path):
+        """Decode one image into slot i; return False if it cannot be read."""
+        img = cv2.imread(path, _REDUCED[self.reduce])
+        if img is None:
+            return False
+        width, height = self.size
+        if img.shape[1] == width and img.shape[0] == height:
+            self.frames[i] = img
+        else:
+            cv2.resize(img, (width, height), dst=self.frames[i], interpolation=cv2.INTER_AREA)
+        self._scale[i] = (img.shape[1] * self.reduce / width, img.shape[0] * self.reduce / height)
+        return True
+
+    def run(self, paths):
+        """Return one metrics dict (or None if unreadable) per path, in order."""
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for start in range(0, len(paths), self.batch_size):
+                results.extend(self._run_batch(paths[start:start + self.batch_size], pool))
+        return results
+
+    def _run_batch(self, paths, pool):
+        if self.frames is None:
+            if self.size is None:
+                # Frame size from the first readable image
+                first = next((img for img in (cv2.imread(p, _REDUCED[self.reduce]) for p in paths)
+                              if img is not None), None)
+                if first is None:
+                    return [None] * len(paths)
+                self.size = (first.shape[1], first.shape[0])
+            self._allocate(*self.size)
+        ok = list(pool.map(self._decode, range(len(paths)), paths))
+        n = len(paths)
+        width, height = self.size
+
+        # The batch as one tall image: a single call per operation for all frames
+        frames = self.frames[:n].reshape(n * height, width, 3)
+        hsv = self.hsv[:n].reshape(n * height, width, 3)
+        green = self.green[:n * height]
+        yellow = self.yellow[:n * height]
+        cv2.cvtColor(frames, cv2.COLOR_BGR2HSV, dst=hsv)
+        cv2.inRange(hsv, lower_green, upper_green, dst=green)
+        cv2.inRange(hsv, lower_yellow, upper_yellow, dst=yellow)
+
+        green = green.reshape(n, height, width)
+        yellow = yellow.reshape(n, height, width)
+        green_pixels = np.count_nonzero(green.reshape(n, -1), axis=1)
+        yellow_pixels = np.count_nonzero(yellow.reshape(n, -1), axis=1)
+        rows_with_green = green.any(axis=2)                    # (n, H)
+        top = np.where(rows_with_green.any(axis=1), rows_with_green.argmax(axis=1), height)
+
+        scale = self._scale[:n]
+        area = np.rint(green_pixels * scale[:, 0] * scale[:, 1]).astype(np.int64)
+        plant_height = np.rint((height - top) * scale[:, 1]).astype(np.int64)
+        health = green_pixels / (green_pixels + yellow_pixels + 1)
+        density = green_pixels / (height * width)
+
+        return [
+            {"Area": int(area[i]), "Health": float(health[i]),
+             "Height": int(plant_height[i]), "Density": float(density[i])} if ok[i] else None
+            for i in range(n)
+        ]
+
+
+def per_file(paths):
+    """The analyze.py loop: full decode and analyze_image() for each file."""
+    results = []
+    for path in paths:
+        img = cv2.imread(path)
+        results.append(analyze_image(img)[0] if img is not None else None)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyse images in batches and report frames per second.")
+    parser.add_argument("--img", default="img", help="image folder (default: img)")
+    parser.add_argument("--batch", type=int, default=16, help="frames per batch (default: 16)")
+    parser.add_argument("--reduce", type=int, default=4, choices=sorted(_REDUCED), help="decode at 1/reduce size (default: 4)")
+    parser.add_argument("--workers", type=int, default=4, help="decode threads (default: 4)")
+    parser.add_argument("--csv", help="write the metrics to this CSV file")
+    parser.add_argument("--compare", action="store_true", help="also time the per-file loop of analyze.py")
+    args = parser.parse_args()
+
+    files = sorted((f for f in os.listdir(args.img) if f.endswith(".jpg")), key=capture_key)
+    paths = [os.path.join(args.img, f) for f in files]
+
+    engine = BatchEngine(args.batch, args.reduce, workers=args.workers)
+    start = time.perf_counter()
+    results = engine.run(paths)
+    elapsed = time.perf_counter() - start
+    if engine.size is None:
+        sys.exit(f"No readable .jpg images in {args.img}/")
+    print(f"Batch engine: {len(paths)} frames in {elapsed:.2f}s = {len(paths) / elapsed:.1f} fps "
+          f"(batch {args.batch}, 1/{args.reduce} size, {engine.size[0]}x{engine.size[1]})")
+
+    if args.compare:
+        start = time.perf_counter()
+        reference = per_file(paths)
+        ref_elapsed = time.perf_counter() - start
+        print(f"Per-file loop: {len(paths)} frames in {ref_elapsed:.2f}s = {len(paths) / ref_elapsed:.1f} fps "
+              f"(x{ref_elapsed / elapsed:.1f} slower)")
+        for key in ("Area", "Health", "Height", "Density"):
+            diffs = [abs(r[key] - b[key]) / (abs(r[key]) or 1) for r, b in zip(reference, results) if r and b]
+            if diffs:
+                print(f"  {key}: mean difference {100 * np.mean(diffs):.1f}%, max {100 * max(diffs):.1f}%")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Image", "Area", "Health", "Height", "Density"])
+            for name, metrics in zip(files, results):
+                if metrics:
+                    writer.writerow([name, metrics["Area"], metrics["Health"], metrics["Height"], metrics["Density"]])
+        print("CSV saved:", args.csv)
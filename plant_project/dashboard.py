@@ -8,6 +8,12 @@ import json
 # Read CSV
 df = pd.read_csv("plant_analysis.csv")
 
+# Leave out dark, blank and duplicate frames (frames.csv is written by analyze.py)
+if os.path.exists("frames.csv"):
+    frames = pd.read_csv("frames.csv")
+    skipped = set(frames.loc[frames["Frame"] != "ok", "Image"])
+    df = df[~df["Image"].isin(skipped)].reset_index(drop=True)
+
 # Convert image to base64 string
 def image_to_base64(image_path):
     # Convert image to base64 string
@@ -17,13 +23,31 @@ def image_to_base64(image_path):
             return f"data:image/jpeg;base64,{encoded}"
     return None
 
+# Overlay made in memory from the original, so it always matches the current colour bounds
+def overlay_to_base64(image_path):
+    if not os.path.exists(image_path):
+        return None
+    import cv2
+    from analyze import analyze_image, make_overlay
+    img = cv2.imread(image_path, cv2.IMREAD_REDUCED_COLOR_2)
+    if img is None:
+        return None
+    _, green_mask, yellow_mask = analyze_image(img)
+    ok, jpeg = cv2.imencode(".jpg", make_overlay(img, green_mask, yellow_mask), [cv2.IMWRITE_JPEG_QUALITY, 85])
+    if not ok:
+        return None
+    return f"data:image/jpeg;base64,{base64.b64encode(jpeg.tobytes()).decode('utf-8')}"
+
 # Convert overlay images to base64 strings
+# Saved overlay JPEGs are only current when analyze.py writes them on every run
+from analyze import overlay_folder, save_overlay_files
+
 overlay_base64_list = []
 original_base64_list = []
 for name in df["Image"]:
     # Overlay image
-    overlay_path = os.path.join("overlay", name)
-    overlay_str = image_to_base64(overlay_path)
+    overlay_str = image_to_base64(os.path.join(overlay_folder, name)) if save_overlay_files else None
+    overlay_str = overlay_str or overlay_to_base64(os.path.join("img", name))
     overlay_base64_list.append(overlay_str if overlay_str else "")
     
     # Original image
@@ -0,0 +1,183 @@
+"""
+Review export: one time-lapse video and a few contact sheets instead of one overlay JPEG per image.
+
+Frames are streamed in capture order, one at a time: each image is shown as original | overlay
+side by side, scaled to the chosen width, and
+  - appended to a time-lapse video (timelapse.mp4, one frame per image), and
+  - placed as a tile on a contact sheet (contact_sheets/sheet_001.jpg, ...), cols x rows tiles
+    per sheet, each labelled with the image name; a sheet is written as soon as it is full.
+Memory use does not grow with the number of images: only the current frame and one sheet
+canvas are held.
+
+analyze.py feeds its frames to ReviewExport while it runs. For a folder of images (e.g. a
+station's images/), run this script directly; it decodes each image at reduced size.
+
+Usage:  python export.py [--img img] [--video timelapse.mp4] [--sheets contact_sheets]
+                         [--width 960] [--fps 8] [--cols 6] [--rows 5] [--tile-width 480]
+"""
+import os
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from analyze import analyze_image, make_overlay
+from frames import capture_key
+
+FOURCC = "mp4v"
+LABEL_HEIGHT = 22
+
+
+def side_by_side(original, overlay, width):
+    """original | overlay, resized so the pair is `width` pixels wide (height keeps the aspect ratio)."""
+    h, w = original.shape[:2]
+    half = width // 2
+    height = max(2, int(round(h * half / w)) // 2 * 2)   # even, for video encoders
+    frame = np.empty((height, half * 2, 3), np.uint8)
+    cv2.resize(original, (half, height), dst=frame[:, :half], interpolation=cv2.INTER_AREA)
+    cv2.resize(overlay, (half, height), dst=frame[:, half:], interpolation=cv2.INTER_AREA)
+    return frame
+
+
+class TimelapseWriter:
+    """Video file written one frame at a time; every frame is resized to the first frame's size."""
+
+    def __init__(self, path, fps=8, fourcc=FOURCC):
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.size = None
+        self.frames = 0
+        self._writer = None
+
+    def add(self, frame, label=""):
+        if self._writer is None:
+            self.size = (frame.shape[1], frame.shape[0])
+            self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self.size)
+            if not self._writer.isOpened():
+                raise OSError(f"Cannot write video {self.path} (codec {self.fourcc})")
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if label:
+            frame = frame.copy()
+            cv2.putText(frame, label, (8, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2, cv2.LINE_AA)
+        self._writer.write(frame)
+        self.frames += 1
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+
+class ContactSheetWriter:
+    """Tiles frames onto cols x rows sheets, written to folder/sheet_NNN.jpg as each one fills up."""
+
+    def __init__(self, folder, tile_width=480, cols=6, rows=5, quality=85):
+        self.folder = folder
+        self.tile_width = tile_width
+        self.cols = cols
+        self.rows = rows
+        self.quality = quality
+        self.paths = []
+        self._canvas = None
+        self._tile_size = None
+        self._count = 0     # tiles on the current sheet
+
+    def add(self, frame, label=""):
+        if self._canvas is None:
+            h, w = frame.shape[:2]
+            tile_h = int(round(h * self.tile_width / w))
+            self._tile_size = (self.tile_width, tile_h)
+            self._canvas = np.zeros((self.rows * (tile_h + LABEL_HEIGHT), self.cols * self.tile_width, 3), np.uint8)
+            os.makedirs(self.folder, exist_ok=True)
+        tile_w, tile_h = self._tile_size
+        row, col = divmod(self._count, self.cols)
+        y = row * (tile_h + LABEL_HEIGHT)
+        x = col * tile_w
+        cv2.resize(frame, (tile_w, tile_h), dst=self._canvas[y:y + tile_h, x:x + tile_w], interpolation=cv2.INTER_AREA)
+        cv2.putText(self._canvas, label, (x + 4, y + tile_h + LABEL_HEIGHT - 6),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+        self._count += 1
+        if self._count == self.cols * self.rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._count:
+            return
+        rows_used = (self._count + self.cols - 1) // self.cols
+        tile_h = self._tile_size[1] + LABEL_HEIGHT
+        path = os.path.join(self.folder, f"sheet_{len(self.paths) + 1:03d}.jpg")
+        cv2.imwrite(path, self._canvas[:rows_used * tile_h], [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        self.paths.append(path)
+        self._canvas[:] = 0
+        self._count = 0
+
+    def close(self):
+        self._flush()
+
+
+class ReviewExport:
+    """Time-lapse video and contact sheets of original | overlay pairs, fed one image at a time."""
+
+    def __init__(self, video_path="timelapse.mp4", sheet_folder="contact_sheets",
+                 width=960, fps=8, cols=6, rows=5, tile_width=480):
+        self.width = width
+        self.video = TimelapseWriter(video_path, fps) if video_path else None
+        self.sheets = ContactSheetWriter(sheet_folder, tile_width, cols, rows) if sheet_folder else None
+
+    def add(self, name, original, overlay):
+        frame = side_by_side(original, overlay, self.width)
+        if self.video:
+            try:
+                self.video.add(frame, name)
+            except OSError as e:
+                # e.g. an OpenCV build without a video codec: keep going with contact sheets only
+                print(f"{e} - continuing without the time-lapse")
+                self.video.close()
+                self.video = None
+        if self.sheets:
+            self.sheets.add(frame, name)
+
+    def close(self):
+        if self.video:
+            self.video.close()
+        if self.sheets:
+            self.sheets.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream images into a time-lapse video and contact sheets.")
+    parser.add_argument("--img", default="img", help="image folder (default: img)")
+    parser.add_argument("--video", default="timelapse.mp4", help="video file, '' for none (default: timelapse.mp4)")
+    parser.add_argument("--sheets", default="contact_sheets", help="contact sheet folder, '' for none (default: contact_sheets)")
+    parser.add_argument("--width", type=int, default=960, help="video width in pixels (default: 960)")
+    parser.add_argument("--fps", type=float, default=8, help="video frames per second (default: 8)")
+    parser.add_argument("--cols", type=int, default=6, help="tiles per sheet row (default: 6)")
+    parser.add_argument("--rows", type=int, default=5, help="tile rows per sheet (default: 5)")
+    parser.add_argument("--tile-width", type=int, default=480, help="tile width in pixels (default: 480)")
+    args = parser.parse_args()
+
+    files = sorted((f for f in os.listdir(args.img) if f.lower().endswith(".jpg")), key=capture_key)
+    export = ReviewExport(args.video, args.sheets, args.width, args.fps, args.cols, args.rows, args.tile_width)
+    start = time.perf_counter()
+    input_bytes = 0
+    for file in files:
+        path = os.path.join(args.img, file)
+        # A reduced decode is enough for review frames (and keeps memory per frame small)
+        img = cv2.imread(path, cv2.IMREAD_REDUCED_COLOR_2)
+        if img is None:
+            print("Cannot read", path)
+            continue
+        input_bytes += os.path.getsize(path)
+        _, green_mask, yellow_mask = analyze_image(img)
+        export.add(file, img, make_overlay(img, green_mask, yellow_mask))
+    export.close()
+
+    outputs = ([args.video] if export.video else []) + (export.sheets.paths if export.sheets else [])
+    output_bytes = sum(os.path.getsize(p) for p in outputs if os.path.exists(p))
+    print(f"{len(files)} images ({input_bytes / 1e6:.1f} MB) -> {len(outputs)} files ({output_bytes / 1e6:.1f} MB) "
+          f"in {time.perf_counter() - start:.1f}s")
+    for path in outputs:
+        print(" ", path)
@@ -0,0 +1,98 @@
+"""
+Early frame check: find dark, blank and near-duplicate images before the full analysis.
+
+Each image is decoded at 1/8 size in greyscale (cheap compared with the full decode), and gives
+  - a 64-bit difference hash (is each cell of an 8x8 grid brighter than its right-hand neighbour?)
+  - brightness (mean) and contrast (standard deviation)
+Frames are then marked as
+  dark       brightness under DARK_MEAN (e.g. night shots)
+  blank      contrast under BLANK_CONTRAST (covered lens, fog, burnt-out exposure)
+  duplicate  at most DUPLICATE_DISTANCE hash bits from the last good frame taken at most
+             DUPLICATE_WINDOW seconds earlier (repeated test captures a few minutes apart)
+  ok         everything else
+Same method as weather_station/analysis/frame_check.py, so the station and this project agree.
+
+Duplicates need capture times, which come from station file names (YYYYMMDD_HHMMSS*.jpg, e.g. the
+images of an ingest archive). Images named by date only (YYYY-M-D.jpg) carry no time of day, and
+file times are those of the last copy, so such images are only checked for dark / blank frames.
+"""
+import os
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+DARK_MEAN = 40            # 0-255 greyscale
+BLANK_CONTRAST = 6        # standard deviation of the greyscale image
+DUPLICATE_DISTANCE = 6    # of 64 hash bits
+DUPLICATE_WINDOW = 1800   # seconds
+
+FRAME_FIELDS = ["Image", "Frame", "Hash", "Brightness", "Contrast", "DuplicateOf"]
+
+
+def frame_time(name):
+    """Capture time from a station file name (YYYYMMDD_HHMMSS*.jpg), or None (e.g. YYYY-M-D.jpg has no time)."""
+    try:
+        return datetime.strptime(name[:15], "%Y%m%d_%H%M%S").timestamp()
+    except ValueError:
+        return None
+
+
+def capture_key(name):
+    """Sort key for capture order: station names (YYYYMMDD_HHMMSS*.jpg) or dated names (YYYY-M-D.jpg)."""
+    taken = frame_time(name)
+    if taken is not None:
+        return datetime.fromtimestamp(taken), name
+    try:
+        return datetime.strptime(name[:-4], "%Y-%m-%d"), name
+    except ValueError:
+        return datetime.max, name
+
+
+def frame_stats(path):
+    """Return (hash, brightness, contrast) of one image, or None if it cannot be read."""
+    grey = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if grey is None:
+        return None
+    small = cv2.resize(grey, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(small[:, 1:] > small[:, :-1])
+    mean, std = cv2.meanStdDev(grey)
+    return int.from_bytes(bits.tobytes(), "big"), float(mean[0][0]), float(std[0][0])
+
+
+def hash_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class FrameFilter:
+    """Classify frames in capture order; call check() once per image."""
+
+    def __init__(self, max_distance=DUPLICATE_DISTANCE, window=DUPLICATE_WINDOW):
+        self.max_distance = max_distance
+        self.window = window
+        self.last = None   # (hash, time, name) of the last "ok" frame with a known time
+
+    def check(self, path, taken_at=None):
+        """Return a dict with FRAME_FIELDS; Frame is "ok", "dark", "blank", "duplicate" or "unreadable".
+        Without taken_at a frame is never marked as a duplicate."""
+        name = os.path.basename(path)
+        stats = frame_stats(path)
+        if stats is None:
+            return {"Image": name, "Frame": "unreadable", "Hash": "", "Brightness": "", "Contrast": "", "DuplicateOf": ""}
+        phash, brightness, contrast = stats
+        frame = {"Image": name, "Frame": "ok", "Hash": f"{phash:016x}",
+                 "Brightness": round(brightness, 1), "Contrast": round(contrast, 1), "DuplicateOf": ""}
+        if brightness < DARK_MEAN:
+            frame["Frame"] = "dark"
+        elif contrast < BLANK_CONTRAST:
+            frame["Frame"] = "blank"
+        elif taken_at is not None:
+            last = self.last
+            if (last is not None and 0 <= taken_at - last[1] <= self.window
+                    and hash_distance(phash, last[0]) <= self.max_distance):
+                frame["Frame"] = "duplicate"
+                frame["DuplicateOf"] = last[2]
+            else:
+                self.last = (phash, taken_at, name)
+        return frame
+
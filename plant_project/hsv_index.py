@@ -0,0 +1,166 @@
+"""
+HSV histogram index: try new green / yellow thresholds over the whole series without decoding a
+single image again.
+
+Each image is reduced once to a quantized 3D HSV histogram (H in 180 bins of 1, S and V in 32 bins
+of 8), saved compressed as hsv_index/<image>.npz. To answer a query, the histograms are stacked
+and turned into summed-volume tables (cumulative sums along H, S and V). The pixel count inside
+any threshold box is then 8 lookups per image, so Area, Health and Density for new bounds take
+milliseconds over the full series.
+
+Bounds are inclusive, like cv2.inRange. H is exact; S and V are exact on multiples of 8
+(e.g. the default 40 and 255) and otherwise rounded to the nearest bin edge.
+
+Usage:  python hsv_index.py build
+        python hsv_index.py query --green 35,40,40 85,255,255 --yellow 20,40,40 35,255,255
+"""
+import os
+import csv
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from analyze import lower_green, upper_green, lower_yellow, upper_yellow
+from frames import capture_key
+
+INDEX_DIR = "hsv_index"
+BINS = (180, 32, 32)           # H, S, V
+RANGES = [0, 180, 0, 256, 0, 256]
+STEPS = (1, 8, 8)              # values per bin
+
+
+def hsv_histogram(img):
+    """Quantized H x S x V pixel counts of one BGR image."""
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1, 2], None, list(BINS), RANGES)
+    return hist.astype(np.uint32)
+
+
+def index_path(name, index_dir=INDEX_DIR):
+    return os.path.join(index_dir, name + ".npz")
+
+
+def save_histogram(name, img, index_dir=INDEX_DIR):
+    os.makedirs(index_dir, exist_ok=True)
+    np.savez_compressed(index_path(name, index_dir), hist=hsv_histogram(img))
+
+
+def build_index(folder="img", index_dir=INDEX_DIR):
+    """Add a histogram for every image that has none (or an older one); return how many were added."""
+    added = 0
+    for name in sorted(f for f in os.listdir(folder) if f.endswith(".jpg")):
+        path = os.path.join(folder, name)
+        target = index_path(name, index_dir)
+        if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+            continue
+        img = cv2.imread(path)
+        if img is None:
+            print("Cannot read", path)
+            continue
+        save_histogram(name, img, index_dir)
+        added += 1
+    return added
+
+
+def _bin_range(lower, upper):
+    """Inclusive value bounds -> half-open bin range [lo, hi) for each channel."""
+    lo = [int(round(int(v) / step)) for v, step in zip(lower, STEPS)]
+    hi = [int(round((int(v) + 1) / step)) for v, step in zip(upper, STEPS)]
+    return [(min(max(a, 0), n), min(max(b, 0), n)) for a, b, n in zip(lo, hi, BINS)]
+
+
+class HsvIndex:
+    """Summed-volume tables of a series of histograms, for threshold-box pixel counts."""
+
+    def __init__(self, names, hists):
+        self.names = list(names)
+        self.totals = hists.reshape(len(self.names), -1).sum(axis=1, dtype=np.int64)
+        # table[n, h, s, v] = pixels of image n with H < h, S bin < s, V bin < v
+        table = np.zeros((len(self.names),) + tuple(b + 1 for b in BINS), np.uint32)
+        table[:, 1:, 1:, 1:] = hists
+        for axis in (1, 2, 3):
+            np.cumsum(table, axis=axis, out=table)
+        self.table = table
+
+    @classmethod
+    def load(cls, index_dir=INDEX_DIR, names=None):
+        """Load the histograms of `names` (default: all indexed images, in capture order)."""
+        if names is None:
+            names = [f[:-4] for f in os.listdir(index_dir) if f.endswith(".jpg.npz")]
+            names.sort(key=capture_key)
+        hists = np.empty((len(names),) + BINS, np.uint32)
+        for i, name in enumerate(names):
+            with np.load(index_path(name, index_dir)) as data:
+                hists[i] = data["hist"]
+        return cls(names, hists)
+
+    def count(self, lower, upper):
+        """Pixels of every image inside the HSV box [lower, upper] (inclusive), as an int64 array."""
+        (h0, h1), (s0, s1), (v0, v1) = _bin_range(lower, upper)
+        if h0 >= h1 or s0 >= s1 or v0 >= v1:
+            return np.zeros(len(self.names), np.int64)
+        t = self.table
+        return (t[:, h1, s1, v1].astype(np.int64)
+                - t[:, h0, s1, v1] - t[:, h1, s0, v1] - t[:, h1, s1, v0]
+                + t[:, h0, s0, v1] + t[:, h0, s1, v0] + t[:, h1, s0, v0]
+                - t[:, h0, s0, v0])
+
+    def metrics(self, green=(lower_green, upper_green), yellow=(lower_yellow, upper_yellow)):
+        """Area, Health and Density for every image (same definitions as analyze_image)."""
+        green_pixels = self.count(*green)
+        yellow_pixels = self.count(*yellow)
+        return {
+            "Area": green_pixels,
+            "Health": green_pixels / (green_pixels + yellow_pixels + 1),
+            "Density": green_pixels / self.totals,
+        }
+
+
+def _hsv(text):
+    values = [int(v) for v in text.split(",")]
+    if len(values) != 3:
+        raise argparse.ArgumentTypeError("expected H,S,V")
+    return np.array(values)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the per-image HSV histogram index.")
+    parser.add_argument("command", choices=["build", "query"])
+    parser.add_argument("--img", default="img", help="image folder (default: img)")
+    parser.add_argument("--index", default=INDEX_DIR, help=f"index folder (default: {INDEX_DIR})")
+    parser.add_argument("--green", nargs=2, type=_hsv, metavar=("LOW", "HIGH"),
+                        default=[lower_green, upper_green], help="green bounds, e.g. 35,40,40 85,255,255")
+    parser.add_argument("--yellow", nargs=2, type=_hsv, metavar=("LOW", "HIGH"),
+                        default=[lower_yellow, upper_yellow], help="yellow bounds, e.g. 20,40,40 35,255,255")
+    parser.add_argument("--csv", help="also write the results to this CSV file")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        added = build_index(args.img, args.index)
+        print(f"{added} histograms added in {time.perf_counter() - start:.1f}s")
+        sys.exit(0)
+
+    if not os.path.isdir(args.index):
+        sys.exit(f"No index in {args.index}/ - run: python hsv_index.py build")
+    index = HsvIndex.load(args.index)
+    start = time.perf_counter()
+    result = index.metrics(tuple(args.green), tuple(args.yellow))
+    elapsed = time.perf_counter() - start
+
+    for i, name in enumerate(index.names):
+        print(name,
+              "Area:", result["Area"][i],
+              "Health:", round(float(result["Health"][i]), 3),
+              "Density:", round(float(result["Density"][i]), 4))
+    print(f"\n{len(index.names)} images in {elapsed * 1000:.1f} ms")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Image", "Area", "Health", "Density"])
+            for i, name in enumerate(index.names):
+                writer.writerow([name, result["Area"][i], result["Health"][i], result["Density"][i]])
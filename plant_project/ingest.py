@@ -0,0 +1,312 @@
+"""
+Ingest USB exports from one or more weather stations into one indexed archive.
+
+Each USB transfer leaves orchard_data_YYYYMMDD_HHMM/ folders (data/, images/, log.txt,
+config.json). This script finds them, and per station (config.json "station_id", or --station):
+  - copies images into archive/<station>/images/, skipping duplicates by sha256
+    (taken from the export's checksums.sha256 when present, otherwise hashed in parallel)
+  - merges climate_log*.csv, climate_agg.csv and climate.bin into archive/<station>/station.sqlite,
+    in tables keyed by time (photo rows by time and image name, so burst photos sharing a
+    timestamp are all kept)
+  - runs analyze.py's green/yellow metrics on new images (in parallel processes)
+Export folders already ingested (same files, sizes and times) are skipped, so re-ingesting a stick does no work.
+
+Usage:  python ingest.py /media/me/USB_STICK [more sticks or export folders] [--archive archive]
+"""
+import os
+import csv
+import sys
+import glob
+import json
+import zlib
+import shutil
+import struct
+import sqlite3
+import hashlib
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+EXPORT_PREFIX = "orchard_data_"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS exports (
+    name TEXT PRIMARY KEY, signature TEXT NOT NULL, ingested_at TEXT NOT NULL,
+    images_new INTEGER, images_duplicate INTEGER, climate_rows INTEGER
+);
+CREATE TABLE IF NOT EXISTS images (
+    sha256 TEXT PRIMARY KEY, name TEXT NOT NULL, captured_at REAL, path TEXT NOT NULL,
+    area INTEGER, health REAL, height INTEGER, density REAL
+);
+CREATE INDEX IF NOT EXISTS images_by_time ON images (captured_at);
+CREATE TABLE IF NOT EXISTS climate (
+    ts REAL PRIMARY KEY, temperature REAL, pressure REAL, humidity REAL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS photos (
+    ts REAL NOT NULL, image TEXT NOT NULL, temperature REAL, pressure REAL, humidity REAL,
+    PRIMARY KEY (ts, image)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS climate_agg (
+    interval_start REAL PRIMARY KEY, interval_end REAL, samples INTEGER,
+    temperature_min REAL, temperature_mean REAL, temperature_max REAL,
+    pressure_min REAL, pressure_mean REAL, pressure_max REAL,
+    humidity_min REAL, humidity_mean REAL, humidity_max REAL
+) WITHOUT ROWID;
+"""
+
+# weather_station/storage/climate_store.py binary format
+_BIN_HEADER = struct.Struct("<4sHH8x")
+_BIN_RECORD = struct.Struct("<dfffI")
+
+
+# -------- Finding exports --------
+def find_exports(paths):
+    """Export folders given directly, or found one level below (e.g. a USB root)."""
+    found = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.basename(path).startswith(EXPORT_PREFIX) and os.path.isdir(path):
+            found.append(path)
+        else:
+            found.extend(sorted(p for p in glob.glob(os.path.join(path, EXPORT_PREFIX + "*")) if os.path.isdir(p)))
+    return found
+
+
+def export_signature(folder):
+    """Cheap identity of an export folder: names, sizes and mtimes of its files (no reading)."""
+    h = hashlib.sha1()
+    for root, _, files in sorted(os.walk(folder)):
+        for name in sorted(files):
+            st = os.stat(os.path.join(root, name))
+            h.update(f"{os.path.relpath(os.path.join(root, name), folder)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def station_of(folder, default):
+    try:
+        with open(os.path.join(folder, "config.json"), "r", encoding="utf-8") as f:
+            return str(json.load(f).get("station_id") or default)
+    except (OSError, ValueError):
+        return default
+
+
+# -------- Climate files --------
+def _parse_time(text):
+    return datetime.strptime(text.strip(), TIME_FORMAT).timestamp()
+
+
+def _float(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_photo_log(path):
+    """Rows (ts, temperature, pressure, humidity, image) from climate_log*.csv (header optional)."""
+    rows = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.reader(f):
+            if len(row) < 5 or row[0] == "timestamp":
+                continue
+            try:
+                ts = _parse_time(row[0])
+            except ValueError:
+                continue
+            rows.append((ts, _float(row[1]), _float(row[2]), _float(row[3]), os.path.basename(row[4])))
+    return rows
+
+
+def read_climate_agg(path):
+    rows = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.reader(f):
+            if len(row) < 12 or row[0] == "interval_start":
+                continue
+            try:
+                rows.append((_parse_time(row[0]), _parse_time(row[1]), int(row[2])) + tuple(_float(v) for v in row[3:12]))
+            except ValueError:
+                continue
+    return rows
+
+
+def read_climate_bin(path):
+    """Raw samples (ts, temperature, pressure, humidity) from a station climate.bin; bad records skipped."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _BIN_HEADER.size or _BIN_HEADER.unpack_from(data)[0] != b"CLIM":
+        return []
+    rows = []
+    body = memoryview(data)[_BIN_HEADER.size:]
+    usable = len(body) - len(body) % _BIN_RECORD.size
+    for i in range(0, usable, _BIN_RECORD.size):
+        ts, temp, pres, hum, crc = _BIN_RECORD.unpack_from(body, i)
+        if zlib.crc32(body[i:i + _BIN_RECORD.size - 4]) == crc:
+            rows.append((ts, round(temp, 2), round(pres, 2), round(hum, 2)))
+    return rows
+
+
+def merge_climate(db, data_dir):
+    """Insert all climate files of one export; return number of rows read."""
+    n = 0
+    for path in sorted(glob.glob(os.path.join(data_dir, "climate.bin"))):
+        rows = read_climate_bin(path)
+        db.executemany("INSERT OR IGNORE INTO climate (ts, temperature, pressure, humidity) VALUES (?, ?, ?, ?)", rows)
+        n += len(rows)
+    for path in sorted(glob.glob(os.path.join(data_dir, "climate_log*.csv"))):
+        rows = read_photo_log(path)
+        db.executemany("INSERT OR IGNORE INTO photos (ts, temperature, pressure, humidity, image) VALUES (?, ?, ?, ?, ?)", rows)
+        # The photo readings also fill the climate series where there are no raw samples
+        db.executemany("INSERT OR IGNORE INTO climate (ts, temperature, pressure, humidity) VALUES (?, ?, ?, ?)",
+                       [row[:4] for row in rows])
+        n += len(rows)
+    for path in sorted(glob.glob(os.path.join(data_dir, "climate_agg.csv"))):
+        rows = read_climate_agg(path)
+        db.executemany("INSERT OR IGNORE INTO climate_agg VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        n += len(rows)
+    return n
+
+
+# -------- Images --------
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_checksums(folder):
+    """{"images/x.jpg": sha256} from the export's checksums.sha256 (written by the station)."""
+    result = {}
+    path = os.path.join(folder, "checksums.sha256")
+    if os.path.isfile(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                digest, _, rel = line.strip().partition("  ")
+                if rel:
+                    result[rel] = digest
+    return result
+
+
+def captured_at(name):
+    """Capture time from station names YYYYMMDD_HHMMSS[_NN].jpg, else None."""
+    try:
+        return datetime.strptime(os.path.basename(name)[:15], "%Y%m%d_%H%M%S").timestamp()
+    except ValueError:
+        return None
+
+
+def _analyze_file(path):
+    import cv2
+    from analyze import analyze_image
+    img = cv2.imread(path)
+    if img is None:
+        return None
+    metrics, _, _ = analyze_image(img)
+    return int(metrics["Area"]), float(metrics["Health"]), int(metrics["Height"]), float(metrics["Density"])
+
+
+def ingest_images(db, folder, station_dir, workers):
+    """Copy new images (deduplicated by sha256) into the archive; return ([(sha256, archive path)], duplicates)."""
+    image_dir = os.path.join(folder, "images")
+    if not os.path.isdir(image_dir):
+        return [], 0
+    names = sorted(n for n in os.listdir(image_dir) if n.lower().endswith(".jpg"))
+    known = read_checksums(folder)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        digests = list(pool.map(
+            lambda n: known.get(f"images/{n}") or sha256_file(os.path.join(image_dir, n)), names))
+
+    archive_images = os.path.join(station_dir, "images")
+    os.makedirs(archive_images, exist_ok=True)
+    new, copies, duplicates = [], [], 0
+    seen = set()
+    for name, digest in zip(names, digests):
+        if digest in seen or db.execute("SELECT 1 FROM images WHERE sha256 = ?", (digest,)).fetchone():
+            duplicates += 1
+            continue
+        seen.add(digest)
+        dest = os.path.join(archive_images, name)
+        if os.path.exists(dest) and sha256_file(dest) == digest:
+            # Copied by an earlier run that stopped before its database commit
+            new.append((digest, name, captured_at(name), dest))
+            continue
+        if os.path.exists(dest):
+            # Same name, different content (e.g. station clock reset): keep both
+            stem, ext = os.path.splitext(name)
+            dest = os.path.join(archive_images, f"{stem}_{digest[:8]}{ext}")
+        copies.append((os.path.join(image_dir, name), dest))
+        new.append((digest, os.path.basename(dest), captured_at(name), dest))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda job: shutil.copy2(*job), copies))
+    db.executemany("INSERT INTO images (sha256, name, captured_at, path) VALUES (?, ?, ?, ?)", new)
+    return [(digest, path) for digest, _, _, path in new], duplicates
+
+
+def analyze_new(db, images, workers):
+    """Compute plant metrics for newly archived images in worker processes."""
+    if not images:
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_analyze_file, [path for _, path in images], chunksize=4)
+        for (digest, _), metrics in zip(images, results):
+            if metrics is not None:
+                db.execute("UPDATE images SET area = ?, health = ?, height = ?, density = ? WHERE sha256 = ?",
+                           metrics + (digest,))
+
+
+# -------- Main --------
+def open_station_db(station_dir):
+    os.makedirs(station_dir, exist_ok=True)
+    db = sqlite3.connect(os.path.join(station_dir, "station.sqlite"))
+    db.executescript(SCHEMA)
+    return db
+
+
+def ingest(paths, archive="archive", default_station="station", workers=None, analyze=True):
+    workers = workers or min(8, os.cpu_count() or 2)
+    summary = []
+    for folder in find_exports(paths):
+        name = os.path.basename(folder)
+        station = station_of(folder, default_station)
+        station_dir = os.path.join(archive, station)
+        db = open_station_db(station_dir)
+        try:
+            signature = export_signature(folder)
+            row = db.execute("SELECT signature FROM exports WHERE name = ?", (name,)).fetchone()
+            if row and row[0] == signature:
+                summary.append((station, name, "already ingested"))
+                continue
+            with db:  # one transaction per export: a crash leaves it un-ingested, not half-ingested
+                images, duplicates = ingest_images(db, folder, station_dir, workers)
+                if analyze:
+                    analyze_new(db, images, workers)
+                n_climate = merge_climate(db, os.path.join(folder, "data"))
+                if os.path.isfile(os.path.join(folder, "log.txt")):
+                    os.makedirs(os.path.join(station_dir, "logs"), exist_ok=True)
+                    shutil.copy2(os.path.join(folder, "log.txt"), os.path.join(station_dir, "logs", f"{name}.txt"))
+                db.execute("INSERT OR REPLACE INTO exports VALUES (?, ?, ?, ?, ?, ?)",
+                           (name, signature, datetime.now().strftime(TIME_FORMAT), len(images), duplicates, n_climate))
+            summary.append((station, name, f"{len(images)} new images, {duplicates} duplicates, {n_climate} climate rows"))
+        finally:
+            db.close()
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge weather station USB exports into one archive.")
+    parser.add_argument("paths", nargs="+", help="USB roots or orchard_data_* folders")
+    parser.add_argument("--archive", default="archive", help="archive folder (default: archive)")
+    parser.add_argument("--station", default="station", help="station name when config.json has no station_id")
+    parser.add_argument("--workers", type=int, default=None, help="parallel workers (default: CPU count, max 8)")
+    parser.add_argument("--no-analysis", action="store_true", help="do not compute plant metrics")
+    args = parser.parse_args()
+
+    results = ingest(args.paths, args.archive, args.station, args.workers, not args.no_analysis)
+    if not results:
+        print("No orchard_data_* folders found.")
+        sys.exit(1)
+    for station, name, message in results:
+        print(f"[{station}] {name}: {message}")
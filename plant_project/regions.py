@@ -0,0 +1,166 @@
+"""
+Multi-plant segmentation: split each frame into regions (one per tree / row) and compute
+Area, Health, Height and Density per region instead of over the whole frame.
+
+Regions come from either
+  - configured ROIs in regions.json, e.g. {"rois": [{"name": "tree1", "x": 0.0, "y": 0.1, "w": 0.5, "h": 0.9}]}
+    (x, y, w, h as fractions of the image, so they survive a change of resolution), or
+  - connected components of the plant mask (green + yellow pixels after a small closing, so
+    the leaves of one plant join up); components under MIN_REGION_FRACTION of the frame are ignored.
+
+Labelling is done once per frame (cv2.connectedComponentsWithStats) and every per-region
+measure is a vectorised reduction over the label image (np.bincount / np.minimum.at), so the
+cost grows with the number of pixels, not with the number of regions.
+
+Components are given stable ids across the time series by RegionTracker (nearest centroid).
+"""
+import json
+import os
+
+import cv2
+import numpy as np
+
+MIN_REGION_FRACTION = 0.002   # smallest component kept, as a fraction of the frame
+CLOSE_FRACTION = 0.01         # closing kernel size, as a fraction of the frame width
+MAX_MOVE_FRACTION = 0.15      # a tracked region may move this much (of the diagonal) between frames
+
+REGION_FIELDS = ["Region", "Area", "Health", "Height", "Density",
+                 "CenterX", "CenterY", "BoxLeft", "BoxTop", "BoxWidth", "BoxHeight"]
+
+
+def load_rois(path="regions.json"):
+    """Return the configured ROIs, or None to use connected components."""
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        rois = json.load(f).get("rois") or None
+    return rois
+
+
+def roi_labels(shape, rois):
+    """Label image with 1..n for the ROIs (later ROIs win where they overlap); 0 = outside."""
+    h, w = shape[:2]
+    labels = np.zeros((h, w), np.int32)
+    for i, roi in enumerate(rois, start=1):
+        x0, y0 = int(roi["x"] * w), int(roi["y"] * h)
+        x1, y1 = int((roi["x"] + roi["w"]) * w), int((roi["y"] + roi["h"]) * h)
+        labels[max(0, y0):min(h, y1), max(0, x0):min(w, x1)] = i
+    return labels, [str(roi.get("name", i)) for i, roi in enumerate(rois, start=1)]
+
+
+def component_labels(green_mask, yellow_mask, min_fraction=MIN_REGION_FRACTION):
+    """Label connected plants; returns (labels, n) with small components folded into 0."""
+    plant = cv2.bitwise_or(green_mask, yellow_mask)
+    k = max(3, int(plant.shape[1] * CLOSE_FRACTION) | 1)
+    plant = cv2.morphologyEx(plant, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (k, k)))
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(plant, connectivity=8, ltype=cv2.CV_32S)
+    # Renumber kept components 1..m in one lookup, dropping specks
+    keep = stats[:, cv2.CC_STAT_AREA] >= min_fraction * plant.size
+    keep[0] = False
+    lut = np.zeros(n, np.int32)
+    lut[keep] = np.arange(1, int(keep.sum()) + 1)
+    return lut[labels], int(keep.sum())
+
+
+def region_metrics(labels, n, green_mask, yellow_mask):
+    """Per-region metrics as a list of dicts (index i = label i + 1), all from vectorised reductions."""
+    h, w = labels.shape
+    flat = labels.ravel()
+    green = green_mask.ravel() > 0
+    yellow = yellow_mask.ravel() > 0
+    size = n + 1
+    green_count = np.bincount(flat[green], minlength=size)
+    yellow_count = np.bincount(flat[yellow], minlength=size)
+
+    # Bounding box and centroid of each region's green pixels
+    idx = np.flatnonzero(green)
+    lab = flat[idx]
+    rows, cols = np.divmod(idx, w)
+    top = np.full(size, h, np.int64)
+    bottom = np.full(size, -1, np.int64)
+    left = np.full(size, w, np.int64)
+    right = np.full(size, -1, np.int64)
+    np.minimum.at(top, lab, rows)
+    np.maximum.at(bottom, lab, rows)
+    np.minimum.at(left, lab, cols)
+    np.maximum.at(right, lab, cols)
+    safe = np.maximum(green_count, 1)
+    cx = np.bincount(lab, weights=cols, minlength=size) / safe
+    cy = np.bincount(lab, weights=rows, minlength=size) / safe
+
+    results = []
+    for i in range(1, size):
+        g, y = int(green_count[i]), int(yellow_count[i])
+        has = g > 0
+        box_w = int(right[i] - left[i] + 1) if has else 0
+        box_h = int(bottom[i] - top[i] + 1) if has else 0
+        results.append({
+            "Area": g,
+            "Health": g / (g + y + 1),
+            # Same definition as analyze_image: from the region's topmost green row to the frame bottom
+            "Height": int(h - top[i]) if has else 0,
+            # Green pixels / the region's bounding box
+            "Density": g / (box_w * box_h) if has else 0.0,
+            "CenterX": round(float(cx[i]), 1), "CenterY": round(float(cy[i]), 1),
+            "BoxLeft": int(left[i]) if has else 0, "BoxTop": int(top[i]) if has else 0,
+            "BoxWidth": box_w, "BoxHeight": box_h,
+        })
+    return results
+
+
+def segment(green_mask, yellow_mask, rois=None):
+    """Return a list of region dicts (metrics + "Region" name for ROIs, None for components)."""
+    if rois:
+        labels, names = roi_labels(green_mask.shape, rois)
+    else:
+        labels, n = component_labels(green_mask, yellow_mask)
+        names = [None] * n
+    regions = region_metrics(labels, len(names), green_mask, yellow_mask)
+    for region, name in zip(regions, names):
+        region["Region"] = name
+    if not rois:
+        regions = [r for r in regions if r["Area"] > 0]   # e.g. a patch of only yellow pixels
+    return regions
+
+
+class RegionTracker:
+    """
+    Give connected-component regions ids that persist across the time series: each region takes
+    the id of the nearest region of the previous frame (greedy by distance, within
+    MAX_MOVE_FRACTION of the image diagonal); unmatched regions get new ids.
+    """
+
+    def __init__(self, max_move_fraction=MAX_MOVE_FRACTION):
+        self.max_move_fraction = max_move_fraction
+        self.tracks = {}      # id -> last (x, y)
+        self.next_id = 1
+
+    def update(self, regions, shape):
+        """Set region["Region"] to a stable id ("P1", "P2", ...) for regions without a name."""
+        todo = [r for r in regions if r["Region"] is None and r["Area"] > 0]
+        if not todo:
+            return regions
+        ids = list(self.tracks)
+        assigned = {}
+        if ids:
+            prev = np.array([self.tracks[i] for i in ids], float)
+            cur = np.array([(r["CenterX"], r["CenterY"]) for r in todo], float)
+            dist = np.linalg.norm(cur[:, None, :] - prev[None, :, :], axis=2)
+            limit = self.max_move_fraction * float(np.hypot(*shape[:2]))
+            used_prev = set()
+            for flat in np.argsort(dist, axis=None):
+                c, p = divmod(int(flat), len(ids))
+                if dist[c, p] > limit:
+                    break
+                if c in assigned or p in used_prev:
+                    continue
+                assigned[c] = ids[p]
+                used_prev.add(p)
+        for c, region in enumerate(todo):
+            track = assigned.get(c)
+            if track is None:
+                track = f"P{self.next_id}"
+                self.next_id += 1
+            region["Region"] = track
+            self.tracks[track] = (region["CenterX"], region["CenterY"])
+        return regions
@@ -0,0 +1,142 @@
+"""
+On-device plant metrics (same green/yellow HSV method as plant_project/analyze.py), computed on a
+reduced-size decode of each new photo by a low-priority background worker.
+
+Sized for a Raspberry Pi 4: the JPEG is decoded at 1/4 scale by libjpeg (an 8 MP photo becomes
+~820x616, ~1.5 MB of pixels), OpenCV uses one thread, the worker runs at nice 19 and at most
+QUEUE_SIZE photos wait in memory (only their paths). Area and Height are scaled back to
+full-resolution pixels so they stay comparable with analyze.py output.
+"""
+import os
+import queue
+import threading
+
+# Imported on first use: OpenCV + numpy take a noticeable part of a second to import on a Pi
+cv2 = None
+np = None
+_import_failed = False
+
+# Same bounds as plant_project/analyze.py
+LOWER_GREEN = (35, 40, 40)
+UPPER_GREEN = (85, 255, 255)
+LOWER_YELLOW = (20, 40, 40)
+UPPER_YELLOW = (35, 255, 255)
+
+METRIC_FIELDS = ["area", "health", "height", "density"]
+QUEUE_SIZE = 16
+NICE = 19
+_REDUCED = {1: None, 2: "IMREAD_REDUCED_COLOR_2", 4: "IMREAD_REDUCED_COLOR_4", 8: "IMREAD_REDUCED_COLOR_8"}
+
+
+def _load():
+    """Import OpenCV and numpy once; return False if they are not installed (analysis disabled)."""
+    global cv2, np, _import_failed
+    if cv2 is None and not _import_failed:
+        try:
+            import cv2 as _cv2
+            import numpy as _np
+        except ImportError:
+            _import_failed = True
+            return False
+        cv2, np = _cv2, _np
+    return cv2 is not None
+
+
+def available():
+    return _load()
+
+
+def compute_metrics(image_path, reduce=4):
+    """Return {"area", "health", "height", "density"} for one image, or None if it cannot be read."""
+    if not _load():
+        return None
+    flag = getattr(cv2, _REDUCED.get(reduce) or "IMREAD_COLOR")
+    img = cv2.imread(image_path, flag)
+    if img is None:
+        return None
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    green_mask = cv2.inRange(hsv, np.array(LOWER_GREEN), np.array(UPPER_GREEN))
+    yellow_mask = cv2.inRange(hsv, np.array(LOWER_YELLOW), np.array(UPPER_YELLOW))
+    green_pixels = int(cv2.countNonZero(green_mask))
+    yellow_pixels = int(cv2.countNonZero(yellow_mask))
+
+    # Height: from the topmost row containing green to the bottom of the frame
+    rows_with_green = np.flatnonzero(green_mask.any(axis=1))
+    height = green_mask.shape[0] - int(rows_with_green[0]) if rows_with_green.size else 0
+    return {
+        "area": green_pixels * reduce * reduce,
+        "health": round(green_pixels / (green_pixels + yellow_pixels + 1), 4),
+        "height": height * reduce,
+        "density": round(green_pixels / green_mask.size, 4),
+    }
+
+
+class AnalysisWorker:
+    """
+    Background thread that analyses submitted photos one at a time at low CPU priority.
+    on_result(item, metrics) is called on the worker thread (metrics is None if analysis failed).
+    With a frame_filter (analysis/frame_check.py), dark, blank and duplicate photos are not
+    analysed; its result ("frame", "phash", ...) is merged into metrics.
+    """
+
+    def __init__(self, on_result, reduce=4, queue_size=QUEUE_SIZE, frame_filter=None):
+        self.on_result = on_result
+        self.reduce = reduce
+        self.frame_filter = frame_filter
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="plant-analysis", daemon=True)
+            self._thread.start()
+
+    def submit(self, image_path, item=None, taken_at=None):
+        """Queue a photo; return False (caller handles it without metrics) if the queue is full."""
+        try:
+            self._queue.put_nowait((image_path, item, taken_at))
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self):
+        if _load():
+            cv2.setNumThreads(1)
+        try:
+            # Per-thread nice value on Linux: only this worker is deprioritised
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), NICE)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            image_path, item, taken_at = job
+            frame = None
+            if self.frame_filter is not None:
+                try:
+                    frame = self.frame_filter.check(image_path, taken_at)
+                except Exception:
+                    frame = None
+            try:
+                skip = frame is not None and frame["frame"] != "ok"
+                metrics = None if skip else compute_metrics(image_path, self.reduce)
+            except Exception:
+                metrics = None
+            if frame is not None:
+                metrics = dict(metrics or {}, **frame)
+            try:
+                self.on_result(item, metrics)
+            except Exception:
+                pass  # a failed write must not stop the worker
+            finally:
+                self._queue.task_done()
+
+    def stop(self, timeout=30):
+        """Finish queued photos, then stop the thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
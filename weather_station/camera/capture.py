@@ -6,13 +6,21 @@ import os
 import subprocess
 from datetime import datetime
 
-# Default save to images directory in project (can be overridden by caller)
-def take_photo(images_dir=None):
+def photo_filename(images_dir=None, suffix=""):
+    """Return absolute path images_dir/YYYYMMDD_HHMMSS<suffix>.jpg (creates images_dir)."""
     if images_dir is None:
         images_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "images")
     os.makedirs(images_dir, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = os.path.join(images_dir, f"{timestamp}.jpg")
-    # Use absolute path, no dependency on current working directory or network
-    subprocess.run(["rpicam-still", "-o", filename], check=False, timeout=30)
+    return os.path.join(images_dir, f"{timestamp}{suffix}.jpg")
+
+# Default save to images directory in project (can be overridden by caller)
+# Fallback path: one rpicam-still process per photo (see session.py for persistent camera)
+def take_photo(images_dir=None, suffix=""):
+    filename = photo_filename(images_dir, suffix)
+    # Use absolute path, no dependency on current working directory or network; -n: no preview window
+    try:
+        subprocess.run(["rpicam-still", "-n", "-o", filename], check=False, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None  # rpicam-still missing or camera hung: caller logs a failed capture
     return filename if os.path.isfile(filename) else None
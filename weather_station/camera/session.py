@@ -0,0 +1,108 @@
+"""
+Persistent camera session: keep one camera open between captures instead of
+starting rpicam-still (libcamera init, tuning file, mode selection, preview) per photo.
+Uses Picamera2 when installed; otherwise falls back to the rpicam-still subprocess path.
+"""
+import os
+import time
+
+from .capture import take_photo, photo_filename
+
+Picamera2 = None   # imported when the camera is first opened (picamera2 pulls in libcamera, numpy, ...)
+
+
+def _load_picamera2():
+    global Picamera2
+    if Picamera2 is None:
+        try:
+            from picamera2 import Picamera2 as _Picamera2
+        except ImportError:  # Not on a Pi / picamera2 not installed
+            return None
+        Picamera2 = _Picamera2
+    return Picamera2
+
+# Close the camera after this many idle seconds (saves power between sparse captures)
+DEFAULT_IDLE_TIMEOUT = 120
+# Let auto exposure / white balance settle after the camera is (re)started
+SETTLE_SECONDS = 1.0
+
+
+class CameraSession:
+    """One long-lived camera session; opened on first capture, closed when idle."""
+
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, use_session=True):
+        self.idle_timeout = idle_timeout
+        self.use_session = use_session
+        self._camera = None
+        self._last_used = 0.0
+
+    @property
+    def is_open(self):
+        return self._camera is not None
+
+    def open(self):
+        """Start the camera once; return False (and use subprocess fallback) on failure."""
+        if self._camera is not None:
+            return True
+        if not self.use_session or _load_picamera2() is None:
+            self.use_session = False
+            return False
+        try:
+            camera = Picamera2()
+            camera.configure(camera.create_still_configuration())
+            camera.start()
+            time.sleep(SETTLE_SECONDS)
+        except Exception:
+            # Camera busy or driver error: stay on the rpicam-still path from now on
+            self.use_session = False
+            return False
+        self._camera = camera
+        self._last_used = time.monotonic()
+        return True
+
+    def close(self):
+        if self._camera is None:
+            return
+        try:
+            self._camera.stop()
+            self._camera.close()
+        except Exception:
+            pass
+        self._camera = None
+
+    def close_if_idle(self):
+        """Call from the main loop: release the camera when no capture happened recently."""
+        if self._camera is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+
+    def capture(self, images_dir=None, suffix=""):
+        """Take one photo; return file path or None (same contract as take_photo)."""
+        if not self.open():
+            return take_photo(images_dir, suffix=suffix)
+        filename = photo_filename(images_dir, suffix=suffix)
+        try:
+            self._camera.capture_file(filename)
+        except Exception:
+            # Session broke (e.g. camera unplugged): drop it and retry with the subprocess
+            self.close()
+            return take_photo(images_dir, suffix=suffix)
+        self._last_used = time.monotonic()
+        return filename if os.path.isfile(filename) else None
+
+    def burst(self, images_dir=None, count=3, interval=0.0):
+        """Take count photos back to back (interval seconds apart); return list of paths."""
+        paths = []
+        for i in range(count):
+            path = self.capture(images_dir, suffix=f"_{i:02d}" if count > 1 else "")
+            if path:
+                paths.append(path)
+            if interval > 0 and i < count - 1:
+                time.sleep(interval)
+        return paths
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
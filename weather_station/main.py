@@ -1,16 +1,30 @@
 # main.py
 # Plant photo station – runs fully offline (e.g. orchards without WiFi), local + USB copy.
+import time
+STARTUP_T0 = time.monotonic()  # before the other imports, so start-up timing includes them
+
 import os
 import csv
 import json
-import time
 import datetime
 import shutil
+import threading
+import contextlib
 
-from sensors.climate import read_climate
-from camera.capture import take_photo
-from usb.usb_transfer import get_usb_path, transfer_and_clean, sync_usb_config
+# Hardware backends (sensor, camera, OpenCV) are only opened / imported on first use
+from sensors.climate import read_climate, get_sensor as climate_sensor
+from sensors.sampler import ClimateSampler, AGG_HEADER
+from storage.climate_store import ClimateStore
+from storage.budget import StorageManager, add_redundant
+from camera.session import CameraSession
+from analysis.plant_metrics import AnalysisWorker, METRIC_FIELDS, available as analysis_available
+from analysis.frame_check import FrameFilter, FRAME_FIELDS
+from usb.usb_transfer import transfer_and_clean, sync_usb_config
+from usb.hotplug import UsbWatcher
 from usb.led_feedback import led_success, led_error, set_led
+from upload.outbox import Outbox
+from upload.client import Uploader
+from upload.config_sync import ConfigSync, MAX_BURST_COUNT, MAX_BURST_SECONDS
 
 # -------------------- Paths and config --------------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,18 +32,45 @@ DATA_DIR = os.path.join(BASE_DIR, "data")
 IMAGES_DIR = os.path.join(BASE_DIR, "images")
 CONFIG_FILE = os.path.join(BASE_DIR, "config.json")
 CLIMATE_LOG = os.path.join(DATA_DIR, "climate_log.csv")
+CLIMATE_AGG_LOG = os.path.join(DATA_DIR, "climate_agg.csv")
+CLIMATE_BIN_LOG = os.path.join(DATA_DIR, "climate.bin")
 SYSTEM_LOG = os.path.join(BASE_DIR, "log.txt")
+EXPORT_MANIFEST = os.path.join(BASE_DIR, "export_manifest.jsonl")
+STORAGE_STATE = os.path.join(BASE_DIR, "storage_state.json")
+FLAGGED_IMAGES = os.path.join(BASE_DIR, "flagged_images.txt")
+REDUNDANT_IMAGES = os.path.join(BASE_DIR, "redundant_images.txt")
+OUTBOX_DIR = os.path.join(BASE_DIR, "outbox")
+
+IMPORT_SECONDS = time.monotonic() - STARTUP_T0
 
 for folder in [DATA_DIR, IMAGES_DIR]:
     os.makedirs(folder, exist_ok=True)
 
+# One camera session for the whole run (opened on the first capture; falls back to rpicam-still per photo)
+camera = CameraSession()
+
 # -------------------- Helpers --------------------
+def clock_now():
+    """Current local time; the simulation harness (sim/harness.py) replaces it with a virtual clock."""
+    return datetime.datetime.now()
+
 def write_log(message):
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    timestamp = clock_now().strftime("%Y-%m-%d %H:%M:%S")
     with open(SYSTEM_LOG, "a", encoding="utf-8") as f:
         f.write(f"[{timestamp}] {message}\n")
     print(f"[{timestamp}] {message}")
 
+def since_start():
+    """Seconds since the process started (incl. Python start-up, Linux), else since main.py was imported."""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - STARTUP_T0
+
 def load_config():
     """Load config from disk (works offline; user can update by placing config.json on USB)."""
     try:
@@ -46,6 +87,18 @@ def default_config():
         "photo_times": ["08:00"],
         "photo_hour": 8,
         "photo_minute": 0,
+        "burst_count": 1,
+        "burst_interval": 0,
+        "sample_interval": 0,
+        "aggregate_interval": 300,
+        "usb_clean": True,
+        "analyze_images": True,
+        "frame_check": True,
+        "storage_budget_mb": 20000,
+        "min_free_mb": 512,
+        "keep_full_days": 7,
+        "upload_url": "",
+        "config_poll_interval": 300,
     }
 
 def get_schedule_times(config):
@@ -90,46 +143,329 @@ def get_schedule_times(config):
         result.append((m // 60, m % 60))
     return sorted(set(result))
 
-def log_data_to_csv(image_file, climate_data):
-    file_exists = os.path.isfile(CLIMATE_LOG)
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(CLIMATE_LOG, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(["timestamp", "temperature", "pressure", "humidity", "image_path"])
-        writer.writerow([
-            timestamp,
-            climate_data["temperature"],
-            climate_data["pressure"],
-            climate_data["humidity"],
-            image_file,
-        ])
+CLIMATE_HEADER = ["timestamp", "temperature", "pressure", "humidity", "image_path"] + METRIC_FIELDS + FRAME_FIELDS
+_csv_lock = threading.Lock()  # rows come from the main loop and the analysis worker
+
+def _rotate_old_climate_log():
+    """Rename a climate log written with an older header so new rows get a matching header."""
+    try:
+        with open(CLIMATE_LOG, "r", encoding="utf-8") as f:
+            header = f.readline().strip().split(",")
+    except OSError:
+        return
+    if header != CLIMATE_HEADER:
+        stamp = clock_now().strftime("%Y%m%d_%H%M%S")
+        os.replace(CLIMATE_LOG, os.path.join(DATA_DIR, f"climate_log_{stamp}.csv"))
+
+def log_data_to_csv(image_file, climate_data, metrics=None, timestamp=None):
+    """Append one row per photo; plant metrics and frame columns stay empty when not analysed."""
+    if timestamp is None:
+        timestamp = clock_now().strftime("%Y-%m-%d %H:%M:%S")
+    metrics = metrics or {}
+    row = [
+        timestamp,
+        climate_data["temperature"],
+        climate_data["pressure"],
+        climate_data["humidity"],
+        image_file,
+    ] + [metrics.get(name, "") for name in METRIC_FIELDS + FRAME_FIELDS]
+    redundant = metrics.get("frame", "ok") != "ok"
+    with _csv_lock:
+        file_exists = os.path.isfile(CLIMATE_LOG)
+        with open(CLIMATE_LOG, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if not file_exists:
+                writer.writerow(CLIMATE_HEADER)
+            writer.writerow(row)
+    if redundant:
+        # Dark, blank and duplicate photos are shrunk first by the storage budget (which prunes the list)
+        add_redundant(REDUNDANT_IMAGES, image_file)
+    # Only the row of a redundant photo is uploaded, not the photo itself
+    queue_upload("photo", [dict(zip(CLIMATE_HEADER, row))],
+                 None if redundant else os.path.join(IMAGES_DIR, image_file))
+
+# -------------------- Upload --------------------
+outbox = None
+uploader = None
+
+def start_uploader(config):
+    """Upload data and photos to upload_url in the background when it is set (USB copy keeps working)."""
+    global outbox, uploader
+    url = config.get("upload_url")
+    if not url:
+        return
+    try:
+        outbox = Outbox(OUTBOX_DIR)
+        uploader = Uploader(outbox, url, station_id=config.get("station_id") or "default",
+                            token=config.get("upload_token"))
+        uploader.start()
+        write_log(f"Uploading to {url} ({len(outbox)} items waiting in outbox).")
+    except Exception as e:
+        outbox = uploader = None
+        write_log(f"Uploader not started: {e}")
+
+def queue_upload(kind, rows, image_path=None):
+    """Add rows (and a photo) to the outbox; the uploader sends them when the link is up."""
+    if outbox is None:
+        return
+    try:
+        outbox.add_records(kind, rows)
+        if image_path and os.path.isfile(image_path):
+            outbox.add_image(image_path)
+        uploader.wake()
+    except OSError as e:
+        write_log(f"Could not queue upload: {e}")
+
+def stop_uploader():
+    if uploader:
+        uploader.stop()
+
+# -------------------- Remote config --------------------
+config_sync = None
+usb_watcher = None
+_changed_keys = set()
+_changed_lock = threading.Lock()
+SCHEDULE_KEYS = {"enabled", "photo_times", "photos_per_day", "photo_hour", "photo_minute"}
+RESTART_KEYS = {"upload_url", "upload_token", "config_url", "config_poll_interval", "station_id"}
+
+def _on_remote_config(changed, config):
+    """Called on the sync thread after config.json was replaced; the main loop applies it."""
+    write_log(f"Remote config applied: {', '.join(changed)} changed.")
+    with _changed_lock:
+        _changed_keys.update(changed)
+    if usb_watcher:
+        usb_watcher.wake()   # do not wait for the next 5 s tick
+
+def take_config_changes():
+    with _changed_lock:
+        changed = set(_changed_keys)
+        _changed_keys.clear()
+    return changed
+
+def start_config_sync(config):
+    """Poll config_url (or upload_url) for config changes when either is set."""
+    global config_sync
+    url = config.get("config_url") or config.get("upload_url")
+    if not url:
+        return
+    try:
+        config_sync = ConfigSync(url, CONFIG_FILE, station_id=config.get("station_id") or "default",
+                                 token=config.get("upload_token"),
+                                 interval=float(config.get("config_poll_interval", 300)),
+                                 on_change=_on_remote_config,
+                                 on_error=lambda message: write_log(f"Remote config not applied: {message}"))
+        config_sync.start()
+        write_log(f"Polling {url} for config changes every {config_sync.interval:g}s.")
+    except Exception as e:
+        config_sync = None
+        write_log(f"Remote config sync not started: {e}")
+
+def stop_config_sync():
+    if config_sync:
+        config_sync.stop()
+
+def apply_config_changes(config, changed):
+    """Apply changed settings that are only read at start-up (the schedule is re-read every loop)."""
+    global sampler, analyzer
+    if changed & {"sample_interval", "aggregate_interval"}:
+        stop_sampler()
+        sampler = None
+        start_sampler(config)
+    if changed & {"analyze_images", "frame_check"}:
+        if analyzer:
+            stop_analyzer()
+            analyzer = None
+        start_analyzer(config)
+    if storage and changed & {"storage_budget_mb", "min_free_mb", "keep_full_days"}:
+        storage.budget_bytes = int(float(config.get("storage_budget_mb", 20000)) * 1024 * 1024)
+        storage.min_free_bytes = int(float(config.get("min_free_mb", 512)) * 1024 * 1024)
+        storage.keep_full_days = float(config.get("keep_full_days", 7))
+        storage.request_check()
+    if changed & RESTART_KEYS:
+        write_log(f"Changes to {', '.join(sorted(changed & RESTART_KEYS))} take effect after a restart.")
+
+# -------------------- On-device analysis --------------------
+analyzer = None
+
+def _write_analysed_row(item, metrics):
+    """Called on the analysis worker once a photo has been analysed."""
+    image_file, climate_data, timestamp = item
+    log_data_to_csv(image_file, climate_data, metrics, timestamp)
+
+def start_analyzer(config):
+    global analyzer
+    if not config.get("analyze_images", True):
+        return
+    if not analysis_available():
+        write_log("On-device analysis disabled: OpenCV (cv2) not installed.")
+        return
+    frame_filter = FrameFilter() if config.get("frame_check", True) else None
+    analyzer = AnalysisWorker(on_result=_write_analysed_row, frame_filter=frame_filter)
+    analyzer.start()
+
+def stop_analyzer():
+    if analyzer:
+        analyzer.stop()
+
+# -------------------- Storage budget --------------------
+storage = None
+
+def start_storage_manager(config):
+    """Keep images/ + data/ under storage_budget_mb by shrinking old photos in the background."""
+    global storage
+    try:
+        storage = StorageManager(
+            IMAGES_DIR, DATA_DIR, STORAGE_STATE,
+            budget_bytes=int(float(config.get("storage_budget_mb", 20000)) * 1024 * 1024),
+            min_free_bytes=int(float(config.get("min_free_mb", 512)) * 1024 * 1024),
+            keep_full_days=float(config.get("keep_full_days", 7)),
+            flagged_path=FLAGGED_IMAGES, manifest_path=EXPORT_MANIFEST,
+            redundant_path=REDUNDANT_IMAGES,
+        )
+        st = storage.stats()
+        write_log(f"Storage: {st['usage_bytes'] / 1e6:.0f} MB used of {st['budget_bytes'] / 1e6:.0f} MB budget, "
+                  f"{st['bytes_saved'] / 1e6:.0f} MB saved so far "
+                  f"({st['recompressed']} recompressed, {st['downscaled']} downscaled, {st['deleted']} deleted).")
+        storage.start()
+    except Exception as e:
+        storage = None
+        write_log(f"Storage manager not started: {e}")
+
+def stop_storage_manager():
+    if storage:
+        storage.stop()
 
 # -------------------- Core task --------------------
-def run_capture_task():
+NO_CLIMATE = {"temperature": "", "pressure": "", "humidity": ""}
+first_capture_logged = False
+
+def read_climate_or_blank():
+    """Read the sensor; on failure log it and return empty values so the photo is still taken."""
+    try:
+        return read_climate()
+    except Exception as e:
+        write_log(f"Climate sensor unavailable: {e}")
+        return dict(NO_CLIMATE)
+
+def run_capture_task(config=None):
+    global first_capture_logged
     write_log("Starting scheduled capture task...")
+    config = config or {}
+    try:
+        burst_count = max(1, int(config.get("burst_count", 1)))
+        burst_interval = max(0.0, float(config.get("burst_interval", 0)))
+    except (TypeError, ValueError):
+        burst_count, burst_interval = 1, 0.0
+    # The burst blocks the main loop (schedule, USB, config sync): keep it short
+    if burst_count > MAX_BURST_COUNT or (burst_count - 1) * burst_interval > MAX_BURST_SECONDS:
+        burst_count = min(burst_count, MAX_BURST_COUNT)
+        burst_interval = min(burst_interval, MAX_BURST_SECONDS / max(1, burst_count - 1))
+        write_log(f"Burst limited to {burst_count} photos {burst_interval:.1f} s apart")
     try:
-        climate_data = read_climate()
-        image_path = take_photo(IMAGES_DIR)
-        if image_path:
-            log_data_to_csv(os.path.basename(image_path), climate_data)
-            write_log(f"Task success: {climate_data['temperature']}°C, Image: {image_path}")
+        # Reuse the background sampler's latest reading (avoids concurrent I2C access)
+        climate_data = sampler.latest() if sampler and sampler.is_running else None
+        if climate_data is None:
+            climate_data = read_climate_or_blank()
+        if burst_count > 1:
+            image_paths = camera.burst(IMAGES_DIR, burst_count, burst_interval)
+        else:
+            image_path = camera.capture(IMAGES_DIR)
+            image_paths = [image_path] if image_path else []
+        if image_paths:
+            taken = clock_now()
+            timestamp = taken.strftime("%Y-%m-%d %H:%M:%S")
+            for image_path in image_paths:
+                # Row is written by the analysis worker (with metrics) or right away if it is not running / busy
+                item = (os.path.basename(image_path), climate_data, timestamp)
+                if not (analyzer and analyzer.submit(image_path, item, taken.timestamp())):
+                    log_data_to_csv(item[0], item[1], timestamp=item[2])
+                write_log(f"Task success: {climate_data['temperature']}°C, Image: {image_path}")
+            if not first_capture_logged:
+                first_capture_logged = True
+                write_log(f"First capture {since_start():.2f}s after start.")
+            if storage:
+                storage.request_check()
         else:
             write_log("Task failed: Camera capture returned None")
+            if storage and storage.free_bytes() is not None and storage.free_bytes() < storage.min_free_bytes:
+                write_log("SD card is nearly full; freeing space from old photos.")
+                storage.request_check()
     except Exception as e:
         write_log(f"Critical error in run_capture_task: {e}")
 
+# -------------------- Climate sampling --------------------
+sampler = None
+
+def start_sampler(config):
+    """Start high-frequency climate sampling if sample_interval (seconds) > 0 in config."""
+    global sampler
+    try:
+        period = float(config.get("sample_interval", 0))
+        aggregate = float(config.get("aggregate_interval", 300))
+        if period <= 0:
+            return
+        sampler = ClimateSampler(climate_sensor(), CLIMATE_AGG_LOG, sample_period=period,
+                                 aggregate_period=max(aggregate, period),
+                                 store=ClimateStore(CLIMATE_BIN_LOG),
+                                 on_rows=lambda rows: queue_upload("climate_agg", [dict(zip(AGG_HEADER, r)) for r in rows]))
+        sampler.start()
+        write_log(f"Climate sampling every {period:g}s, aggregated every {sampler.aggregate_period:g}s.")
+    except Exception as e:
+        sampler = None
+        write_log(f"Climate sampler not started: {e}")
+
+def stop_sampler():
+    if sampler:
+        sampler.stop()
+        sampler.store.close()
+
+# -------------------- Start-up --------------------
+# Background services, started one per loop pass once the schedule has been checked, so a capture
+# due right after a (re)start is not delayed. Each start_* function logs and contains its own failure.
+STARTUP_STAGES = [
+    ("upload", start_uploader),
+    ("sampler", start_sampler),
+    ("analysis", start_analyzer),
+    ("storage", start_storage_manager),
+    ("remote config", start_config_sync),
+]
+startup_times = {}
+
+def run_stage(name, start, config):
+    """Run one start-up stage and time it; an unexpected error is logged and the station carries on."""
+    t0 = time.monotonic()
+    try:
+        start(config)
+    except Exception as e:
+        write_log(f"Start-up stage '{name}' failed: {e}")
+    startup_times[name] = time.monotonic() - t0
+
+def log_startup_times():
+    stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in startup_times.items())
+    write_log(f"Start-up complete {since_start():.2f}s after start (imports {IMPORT_SECONDS:.2f}s; {stages}).")
+
 # -------------------- Main loop --------------------
 def main():
     write_log("Plant photo station started (offline-friendly, USB copy supported).")
+    _rotate_old_climate_log()
+    pending_stages = list(STARTUP_STAGES)
     # Track (date, hour, minute) already run to avoid duplicate in same minute
     run_done = set()
-    usb_processed = False
+    usb_processed = None  # key (filesystem UUID) of the drive already handled
+    global usb_watcher
+    usb_watcher = UsbWatcher()
+    if not usb_watcher.event_based:
+        write_log("Mount events unavailable; scanning /media for USB drives.")
     last_schedule_log = None  # Log schedule at most once per minute for debugging
 
     while True:
         config = load_config()
-        now = datetime.datetime.now()
+        changed = take_config_changes()
+        if changed:
+            apply_config_changes(config, changed)
+            if changed & SCHEDULE_KEYS:
+                last_schedule_log = None  # log the new schedule now
+        now = clock_now()
         today = now.date()
 
         # Scheduled capture (no network required)
@@ -145,36 +481,57 @@ def main():
                 if now.hour == h and now.minute == m:
                     key = (today, h, m)
                     if key not in run_done:
-                        run_capture_task()
+                        run_capture_task(config)
                         run_done.add(key)
+        # Release the camera between sparse captures (kept open for bursts / dense schedules)
+        camera.close_if_idle()
+
+        # Staged start-up: one background service per pass, right after the schedule check
+        if pending_stages:
+            name, start = pending_stages.pop(0)
+            run_stage(name, start, config)
+            if not pending_stages:
+                log_startup_times()
+
         # Clear run_done at midnight (keep only today)
         if run_done and min(r[0] for r in run_done) < today:
             run_done = {(d, h, m) for d, h, m in run_done if d == today}
 
         # USB: detect drive, sync config, copy data and clean local; show success/failure
-        usb_path = get_usb_path()
-        if usb_path and not usb_processed:
-            write_log(f"USB detected at {usb_path}")
+        drive = usb_watcher.current()
+        usb_path = drive.mount_point if drive else None
+        if drive and drive.key != usb_processed:
+            write_log(f"USB detected at {drive.describe()}")
             if sync_usb_config(usb_path, CONFIG_FILE):
                 write_log("Config updated from USB.")
-            success, message = transfer_and_clean(
-                usb_path, DATA_DIR, IMAGES_DIR,
-                config_file=CONFIG_FILE, system_log=SYSTEM_LOG
-            )
+                new_config = load_config()
+                usb_changed = {k for k in set(config) | set(new_config) if config.get(k) != new_config.get(k)}
+                if usb_changed:
+                    apply_config_changes(new_config, usb_changed)
+            if sampler:
+                sampler.flush()  # export aggregates still held in memory
+            # Pause photo recompression so files do not change while they are copied
+            with storage.busy if storage else contextlib.nullcontext():
+                success, message = transfer_and_clean(
+                    usb_path, DATA_DIR, IMAGES_DIR,
+                    config_file=CONFIG_FILE, system_log=SYSTEM_LOG,
+                    manifest_path=EXPORT_MANIFEST, clean=config.get("usb_clean", True)
+                )
             if success:
                 write_log(f"USB transfer successful: {message}")
                 led_success()
             else:
                 write_log(f"USB transfer failed: {message}")
                 led_error()
-            usb_processed = True
-        elif not usb_path:
+            usb_processed = drive.key
+        elif not drive:
             if usb_processed:
                 write_log("USB removed.")
-            usb_processed = False
+            usb_processed = None
 
-        # Check every 5 seconds to reduce chance of missing the minute
-        time.sleep(5)
+        # Check every 5 seconds to reduce chance of missing the minute; wakes at once on USB mount/unmount
+        # and when a remote config arrives
+        usb_watcher.wait(0 if pending_stages else 5)
 
 if __name__ == "__main__":
     try:
@@ -185,3 +542,10 @@ if __name__ == "__main__":
     except Exception as e:
         write_log(f"System crashed: {e}")
         set_led(0)
+    finally:
+        stop_config_sync()
+        stop_storage_manager()
+        stop_analyzer()
+        stop_sampler()
+        stop_uploader()
+        camera.close()
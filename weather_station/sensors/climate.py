@@ -1,9 +1,25 @@
-from PiicoDev_BME280 import PiicoDev_BME280
+import os
+import threading
 
-sensor = PiicoDev_BME280()
+# The BME280 is opened on first use (not at import), so a missing or faulty sensor does not stop
+# the station from starting; read_climate() raises instead and the caller carries on without it.
+_sensor = None
+_lock = threading.Lock()
+
+def get_sensor():
+    global _sensor
+    with _lock:
+        if _sensor is None:
+            # STATION_SIMULATE=1: use the simulated BME280 (no I2C), e.g. for testing on a normal Linux machine
+            if os.environ.get("STATION_SIMULATE") == "1":
+                from .sim_bme280 import PiicoDev_BME280
+            else:
+                from PiicoDev_BME280 import PiicoDev_BME280
+            _sensor = PiicoDev_BME280()
+        return _sensor
 
 def read_climate():
-    tempC, presPa, humRH = sensor.values()
+    tempC, presPa, humRH = get_sensor().values()
     pres_hPa = presPa / 100
 
     return {
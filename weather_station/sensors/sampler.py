@@ -0,0 +1,199 @@
+"""
+Background climate sampling: read the BME280 every few seconds into a fixed-size ring buffer,
+aggregate each interval to min/mean/max on the device and append the aggregates to CSV in batches.
+Raw samples can also be kept in a binary ClimateStore (storage/climate_store.py), written with the same batches.
+Each written batch of aggregate rows can also be handed to a callback (main.py queues it for upload).
+"""
+import os
+import csv
+import time
+import threading
+from array import array
+from datetime import datetime
+
+FIELDS = ("temperature", "pressure", "humidity")
+AGG_HEADER = ["interval_start", "interval_end", "samples"] + [
+    f"{name}_{stat}" for name in FIELDS for stat in ("min", "mean", "max")
+]
+
+
+class RingBuffer:
+    """Fixed-capacity buffer of (timestamp, temperature, pressure, humidity) in preallocated arrays."""
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.capacity = capacity
+        self._t = array("d", bytes(8 * capacity))
+        self._cols = [array("d", bytes(8 * capacity)) for _ in FIELDS]
+        self._next = 0   # slot written by the next append
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, temperature, pressure, humidity):
+        i = self._next
+        self._t[i] = timestamp
+        self._cols[0][i] = temperature
+        self._cols[1][i] = pressure
+        self._cols[2][i] = humidity
+        self._next = (i + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def _indices(self):
+        """Slot indices from oldest to newest."""
+        start = (self._next - self._count) % self.capacity
+        return ((start + k) % self.capacity for k in range(self._count))
+
+    def latest(self):
+        """Newest sample as (timestamp, temperature, pressure, humidity), or None if empty."""
+        if not self._count:
+            return None
+        i = (self._next - 1) % self.capacity
+        return (self._t[i],) + tuple(col[i] for col in self._cols)
+
+    def stats(self, t_start, t_end):
+        """Return (count, [(min, mean, max) per field]) for samples with t_start <= t < t_end."""
+        idx = [i for i in self._indices() if t_start <= self._t[i] < t_end]
+        if not idx:
+            return 0, []
+        result = []
+        for col in self._cols:
+            values = [col[i] for i in idx]
+            result.append((min(values), sum(values) / len(values), max(values)))
+        return len(idx), result
+
+
+class ClimateSampler:
+    """Sample `sensor` (PiicoDev_BME280 API) on a background thread; write per-interval aggregates."""
+
+    def __init__(self, sensor, out_path, sample_period=10.0, aggregate_period=300.0,
+                 batch_size=12, capacity=None, clock=time.time, store=None, on_rows=None):
+        if sample_period <= 0 or aggregate_period < sample_period:
+            raise ValueError("need 0 < sample_period <= aggregate_period")
+        self.sensor = sensor
+        self.out_path = out_path
+        self.sample_period = float(sample_period)
+        self.aggregate_period = float(aggregate_period)
+        self.batch_size = max(1, int(batch_size))
+        self.clock = clock
+        self.store = store          # optional ClimateStore for every raw sample
+        self.on_rows = on_rows      # optional callback(rows) after aggregate rows are written (e.g. upload)
+        # Room for two full intervals so the closing interval is never overwritten
+        if capacity is None:
+            capacity = 2 * int(aggregate_period // sample_period) + 2
+        self.buffer = RingBuffer(capacity)
+        self._pending = []          # aggregate rows not yet written
+        self._pending_raw = []      # raw samples not yet written to store
+        self._interval_start = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.errors = 0
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def sample_once(self):
+        """Read the sensor once into the ring buffer; close the interval if it has ended."""
+        now = self.clock()
+        try:
+            tempC, presPa, humRH = self.sensor.values()
+        except Exception:
+            self.errors += 1
+            return False
+        with self._lock:
+            if self._interval_start is None or now < self._interval_start:
+                # First sample, or the clock was set back (e.g. RTC-less Pi fixing its time)
+                self._interval_start = now - now % self.aggregate_period
+            while now >= self._interval_start + self.aggregate_period:
+                self._close_interval()
+            self.buffer.append(now, tempC, presPa / 100, humRH)
+            if self.store is not None:
+                self._pending_raw.append((now, tempC, presPa / 100, humRH))
+            flush = len(self._pending) >= self.batch_size
+        if flush:
+            self.flush()
+        return True
+
+    def _close_interval(self):
+        t0 = self._interval_start
+        t1 = t0 + self.aggregate_period
+        count, stats = self.buffer.stats(t0, t1)
+        if count:
+            row = [_fmt_time(t0), _fmt_time(t1), count]
+            for lo, mean, hi in stats:
+                row += [round(lo, 2), round(mean, 2), round(hi, 2)]
+            self._pending.append(row)
+        self._interval_start = t1
+
+    def latest(self):
+        """Most recent reading in read_climate() format, or None before the first sample."""
+        with self._lock:
+            sample = self.buffer.latest()
+        if sample is None:
+            return None
+        _, temp, pres, hum = sample
+        return {"temperature": round(temp, 2), "pressure": round(pres, 2), "humidity": round(hum, 2)}
+
+    def flush(self):
+        """Append pending aggregate rows to the CSV (and raw samples to the store) in one write each."""
+        with self._lock:
+            rows, self._pending = self._pending, []
+            raw, self._pending_raw = self._pending_raw, []
+        if raw:
+            try:
+                self.store.append_many(raw)
+            except OSError:
+                self.errors += 1
+        if not rows:
+            return 0
+        file_exists = os.path.isfile(self.out_path)
+        with open(self.out_path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if not file_exists:
+                writer.writerow(AGG_HEADER)
+            writer.writerows(rows)
+        if self.on_rows is not None:
+            try:
+                self.on_rows(rows)
+            except Exception:
+                self.errors += 1
+        return len(rows)
+
+    def _run(self):
+        # start() already took the first sample
+        next_due = time.monotonic() + self.sample_period
+        while not self._stop.wait(max(0.0, next_due - time.monotonic())):
+            self.sample_once()
+            next_due += self.sample_period
+            # Skip missed slots instead of bursting to catch up (e.g. after a long I2C stall)
+            now = time.monotonic()
+            if next_due < now:
+                next_due = now + self.sample_period
+
+    def start(self):
+        """Take the first sample synchronously, then keep sampling on a daemon thread."""
+        if self.is_running:
+            return
+        self._stop.clear()
+        self.sample_once()
+        self._thread = threading.Thread(target=self._run, name="climate-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling, close the current interval and write everything pending."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.sample_period + 5)
+            self._thread = None
+        with self._lock:
+            if self._interval_start is not None:
+                self._close_interval()
+        self.flush()
+
+
+def _fmt_time(t):
+    return datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S")
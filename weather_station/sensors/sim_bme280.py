@@ -0,0 +1,29 @@
+"""
+Simulated PiicoDev_BME280 stand-in (same values() API) for running and testing without the sensor.
+Produces a daily temperature/humidity cycle plus small noise; pressure drifts slowly.
+"""
+import math
+import random
+import time
+
+
+class PiicoDev_BME280:
+    def __init__(self, temp_mean=20.0, temp_swing=6.0, pressure_hPa=1013.0,
+                 humidity_mean=65.0, humidity_swing=15.0, seed=None, clock=time.time):
+        self.temp_mean = temp_mean
+        self.temp_swing = temp_swing
+        self.pressure_hPa = pressure_hPa
+        self.humidity_mean = humidity_mean
+        self.humidity_swing = humidity_swing
+        self.clock = clock
+        self._rng = random.Random(seed)
+
+    def values(self):
+        """Return (tempC, presPa, humRH) like the real driver."""
+        now = self.clock()
+        # Warmest around 15:00, coolest around 03:00 (local time ignored: UTC seconds of day)
+        phase = 2 * math.pi * ((now % 86400) / 86400 - 0.375)
+        temp = self.temp_mean + self.temp_swing * math.sin(phase) + self._rng.gauss(0, 0.05)
+        hum = self.humidity_mean - self.humidity_swing * math.sin(phase) + self._rng.gauss(0, 0.2)
+        pres = self.pressure_hPa + 2.0 * math.sin(2 * math.pi * now / (5 * 86400)) + self._rng.gauss(0, 0.02)
+        return temp, pres * 100, min(100.0, max(0.0, hum))
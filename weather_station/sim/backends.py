@@ -0,0 +1,156 @@
+"""
+Fake hardware for the simulation harness: camera, USB drive and LEDs. Each has the same interface
+as the real backend main.py uses (CameraSession, UsbWatcher, LedController) and runs on a
+VirtualClock. The BME280 is simulated by sensors/sim_bme280.py with clock=VirtualClock.time.
+"""
+import os
+import struct
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:  # analysis is off without OpenCV, so any JPEG-looking bytes will do
+    cv2 = None
+    np = None
+
+from usb.hotplug import UsbDrive
+from usb.led_feedback import LedController, make_fake_sysfs
+
+_JPEG_SOI = b"\xff\xd8"
+_JPEG_EOI = b"\xff\xd9"
+_COMMENT_MAX = 65533
+
+
+def synthetic_jpeg(size):
+    """
+    A decodable JPEG of about `size` bytes: a small green plant shape on soil (if OpenCV is
+    available), padded with JPEG comment segments, which decoders skip.
+    """
+    body = _JPEG_SOI + _JPEG_EOI
+    if cv2 is not None:
+        img = np.full((480, 640, 3), (40, 70, 110), np.uint8)
+        cv2.ellipse(img, (320, 300), (120, 160), 0, 0, 360, (40, 160, 60), -1)
+        body = cv2.imencode(".jpg", img)[1].tobytes()
+    padding = []
+    missing = size - len(body)
+    while missing > 4:
+        n = min(_COMMENT_MAX, missing - 4)
+        padding.append(b"\xff\xfe" + struct.pack(">H", n + 2) + bytes(n))
+        missing -= n + 4
+    return body[:2] + b"".join(padding) + body[2:]
+
+
+class SimulationEnd(Exception):
+    """Raised from the fake USB watcher's wait() once the simulated period is over."""
+
+
+class FakeCamera:
+    """CameraSession stand-in: writes a fixed photo, named after the virtual time."""
+
+    def __init__(self, clock, template=None, photo_bytes=3_000_000):
+        self.clock = clock
+        if template:
+            with open(template, "rb") as f:
+                self.photo = f.read()
+        else:
+            self.photo = synthetic_jpeg(photo_bytes)
+        self.captures = []      # virtual time of every photo taken
+
+    def capture(self, images_dir=None, suffix=""):
+        os.makedirs(images_dir, exist_ok=True)
+        path = os.path.join(images_dir, self.clock.now().strftime("%Y%m%d_%H%M%S") + f"{suffix}.jpg")
+        with open(path, "wb") as f:
+            f.write(self.photo)
+        self.captures.append(self.clock.time())
+        return path
+
+    def burst(self, images_dir=None, count=3, interval=0.0):
+        paths = []
+        for i in range(count):
+            paths.append(self.capture(images_dir, suffix=f"_{i:02d}" if count > 1 else ""))
+            if interval > 0 and i < count - 1:
+                self.clock.sleep(interval)
+        return paths
+
+    def close_if_idle(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeUsbWatcher:
+    """
+    UsbWatcher stand-in: one USB drive (a folder) that is "mounted" during the given
+    (insert_time, remove_time) windows of virtual time. wait() advances the virtual clock
+    and returns early at an insertion or removal, like a mount event.
+    """
+    event_based = True
+
+    def __init__(self, clock, mount_point, windows, end_time, uuid="SIM-0001"):
+        self.clock = clock
+        self.mount_point = mount_point
+        self.windows = sorted(windows)
+        self.end_time = end_time
+        self.uuid = uuid
+        self.waits = 0
+        self._woken = False
+        os.makedirs(mount_point, exist_ok=True)
+
+    def _mounted(self, t):
+        return any(start <= t < end for start, end in self.windows)
+
+    def _next_change(self, t):
+        edges = [e for window in self.windows for e in window if e > t]
+        return min(edges) if edges else None
+
+    def wait(self, timeout):
+        self.waits += 1
+        if self._woken:
+            self._woken = False
+            return False
+        now = self.clock.time()
+        if now >= self.end_time:
+            raise SimulationEnd()
+        target = min(now + timeout, self.end_time)
+        change = self._next_change(now)
+        changed = change is not None and change <= target
+        self.clock.sleep((change if changed else target) - now)
+        if self.clock.time() >= self.end_time:
+            raise SimulationEnd()
+        return changed
+
+    def wake(self):
+        self._woken = True
+
+    def drives(self):
+        if not self._mounted(self.clock.time()):
+            return []
+        return [UsbDrive(self.mount_point, "/dev/sim1", "vfat", self.uuid)]
+
+    def current(self):
+        drives = self.drives()
+        return drives[0] if drives else None
+
+    def close(self):
+        pass
+
+
+class CountingLedController(LedController):
+    """LedController on a fake sysfs tree that counts brightness writes."""
+
+    def __init__(self, root):
+        super().__init__(make_fake_sysfs(root))
+        self.writes = 0
+
+    def set(self, name, state):
+        self.writes += 1
+        super().set(name, state)
+
+    def toggle(self, name):
+        self.writes += 1
+        super().toggle(name)
+
+    def play(self, name, steps):
+        self.writes += len(steps)
+        super().play(name, steps)
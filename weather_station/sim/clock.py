@@ -0,0 +1,63 @@
+"""
+Virtual clock for simulation: time only moves when the simulated code sleeps, so days of station
+operation run in seconds. Periodic callbacks (e.g. climate sampling) fire in time order while
+the clock is advanced, all on the calling thread, which keeps a run deterministic.
+"""
+import heapq
+import itertools
+from datetime import datetime
+
+
+class VirtualClock:
+    def __init__(self, start=None):
+        start = start or datetime.now().replace(second=0, microsecond=0)
+        self._t = start.timestamp()
+        self.start = self._t
+        self._timers = []           # heap of (due, seq, timer)
+        self._seq = itertools.count()
+        self.wakeups = 0            # every return from sleep() and every timer callback
+
+    # -------------------- Reading --------------------
+    def time(self):
+        """Unix seconds, like time.time()."""
+        return self._t
+
+    def monotonic(self):
+        return self._t - self.start
+
+    def now(self):
+        """Local datetime, like datetime.now()."""
+        return datetime.fromtimestamp(self._t)
+
+    # -------------------- Timers --------------------
+    def call_every(self, period, fn):
+        """Call fn() every period seconds from now on; return a handle for cancel()."""
+        timer = {"period": float(period), "fn": fn, "active": True}
+        heapq.heappush(self._timers, (self._t + timer["period"], next(self._seq), timer))
+        return timer
+
+    def cancel(self, timer):
+        timer["active"] = False
+
+    def next_due(self):
+        while self._timers and not self._timers[0][2]["active"]:
+            heapq.heappop(self._timers)
+        return self._timers[0][0] if self._timers else None
+
+    # -------------------- Advancing --------------------
+    def advance_to(self, t):
+        """Move time forward to t, firing due timers in order."""
+        while True:
+            due = self.next_due()
+            if due is None or due > t:
+                break
+            _, _, timer = heapq.heappop(self._timers)
+            self._t = max(self._t, due)
+            heapq.heappush(self._timers, (due + timer["period"], next(self._seq), timer))
+            self.wakeups += 1
+            timer["fn"]()
+        self._t = max(self._t, t)
+
+    def sleep(self, seconds):
+        self.advance_to(self._t + max(0.0, seconds))
+        self.wakeups += 1
@@ -0,0 +1,302 @@
+"""
+Simulation harness: runs the real main.py loop on any Linux machine with fake hardware
+(sim/backends.py) and a virtual clock (sim/clock.py), so days of operation take seconds, and
+reports the numbers to compare before deploying a change:
+  - scheduling accuracy: delay between each scheduled time and its photo, missed slots
+  - wakeups: main-loop iterations and timer callbacks per simulated hour
+  - bytes written to the station's storage (net growth of data/, images/ and logs, summed
+    between USB transfers) and the total of all write() calls from /proc/self/io
+  - USB transfer throughput to the fake drive (a local folder)
+
+Run from weather_station/:
+  python -m sim.harness --days 2 --photos-per-day 48 --sample-interval 10 --usb-every 24
+Threads that use real time (analysis worker, storage budget) run as usual alongside.
+"""
+import os
+import sys
+import json
+import time
+import bisect
+import shutil
+import argparse
+import tempfile
+from datetime import datetime, timedelta, time as dtime
+
+# Should anything still open the real sensor module, it gets the simulated driver
+os.environ.setdefault("STATION_SIMULATE", "1")
+
+import main  # noqa: E402
+from sensors.sampler import ClimateSampler  # noqa: E402
+from sensors.sim_bme280 import PiicoDev_BME280  # noqa: E402
+from usb import led_feedback  # noqa: E402
+
+from .clock import VirtualClock  # noqa: E402
+from .backends import FakeCamera, FakeUsbWatcher, CountingLedController, SimulationEnd  # noqa: E402
+
+_PATHS = {
+    "DATA_DIR": "data", "IMAGES_DIR": "images", "CONFIG_FILE": "config.json",
+    "CLIMATE_LOG": "data/climate_log.csv", "CLIMATE_AGG_LOG": "data/climate_agg.csv",
+    "CLIMATE_BIN_LOG": "data/climate.bin", "SYSTEM_LOG": "log.txt",
+    "EXPORT_MANIFEST": "export_manifest.jsonl", "STORAGE_STATE": "storage_state.json",
+    "FLAGGED_IMAGES": "flagged_images.txt", "REDUNDANT_IMAGES": "redundant_images.txt",
+    "OUTBOX_DIR": "outbox",
+}
+_SERVICES = ("sampler", "analyzer", "storage", "outbox", "uploader", "config_sync", "usb_watcher")
+
+
+def _tree_size(path):
+    total = 0
+    for folder, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(folder, name))
+            except OSError:
+                pass
+    return total
+
+
+def _proc_io():
+    """Bytes passed to write() by this process so far (Linux), or None."""
+    try:
+        with open("/proc/self/io", "r") as f:
+            return int(dict(line.split(": ") for line in f.read().splitlines())["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def schedule_accuracy(config, captures, start, end, tolerance=60):
+    """Match each scheduled slot in [start, end) with its first photo; return stats dict."""
+    captures = sorted(captures)
+    delays, missed = [], 0
+    if config.get("enabled", True):
+        day = datetime.fromtimestamp(start).date()
+        while datetime.combine(day, dtime()).timestamp() < end:
+            for h, m in main.get_schedule_times(config):
+                slot = datetime.combine(day, dtime(h, m)).timestamp()
+                if slot < start or slot + tolerance > end:
+                    continue
+                i = bisect.bisect_left(captures, slot)
+                if i < len(captures) and captures[i] < slot + tolerance:
+                    delays.append(captures[i] - slot)
+                else:
+                    missed += 1
+            day += timedelta(days=1)
+    return {
+        "slots": len(delays) + missed,
+        "captured": len(delays),
+        "missed": missed,
+        "delay_mean_s": round(sum(delays) / len(delays), 2) if delays else None,
+        "delay_max_s": round(max(delays), 2) if delays else None,
+    }
+
+
+def _virtual_sampler(clock):
+    """ClimateSampler that samples from virtual-clock timers instead of its own thread."""
+
+    class VirtualSampler(ClimateSampler):
+        def __init__(self, *args, **kwargs):
+            kwargs["clock"] = clock.time
+            super().__init__(*args, **kwargs)
+            self._timer = None
+
+        @property
+        def is_running(self):
+            return self._timer is not None
+
+        def start(self):
+            self.sample_once()
+            self._timer = clock.call_every(self.sample_period, self.sample_once)
+
+        def stop(self):
+            if self._timer is not None:
+                clock.cancel(self._timer)
+                self._timer = None
+            super().stop()
+
+    return VirtualSampler
+
+
+class Simulation:
+    def __init__(self, workdir, config, days=1.0, start=None, usb_every=24.0, usb_minutes=10,
+                 photo_bytes=3_000_000, template=None):
+        self.workdir = workdir
+        self.station = os.path.join(workdir, "station")
+        self.usb = os.path.join(workdir, "usb", "SIMUSB")
+        self.config = config
+        start = start or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.clock = VirtualClock(start)
+        self.end = self.clock.time() + days * 86400
+        windows = []
+        if usb_every and usb_every > 0:
+            t = self.clock.time() + usb_every * 3600
+            while t < self.end:
+                windows.append((t, t + usb_minutes * 60))
+                t += usb_every * 3600
+        self.camera = FakeCamera(self.clock, template, photo_bytes)
+        self.watcher = FakeUsbWatcher(self.clock, self.usb, windows, self.end)
+        self.leds = CountingLedController(os.path.join(workdir, "leds"))
+        self.sensor = PiicoDev_BME280(seed=1, clock=self.clock.time)
+        self.transfers = []
+        self._sd_written = 0
+        self._sd_size = 0
+
+    # -------------------- Patching main.py --------------------
+    def _read_climate(self):
+        tempC, presPa, humRH = self.sensor.values()
+        return {"temperature": round(tempC, 2), "pressure": round(presPa / 100, 2), "humidity": round(humRH, 2)}
+
+    def _transfer(self, *args, **kwargs):
+        self._sd_written += max(0, _tree_size(self.station) - self._sd_size)
+        usb_before = _tree_size(self.usb)
+        started = time.perf_counter()
+        result = self._orig_transfer(*args, **kwargs)
+        seconds = time.perf_counter() - started
+        copied = _tree_size(self.usb) - usb_before
+        self.transfers.append({"ok": result[0], "bytes": copied, "seconds": round(seconds, 3),
+                               "mb_per_s": round(copied / 1e6 / seconds, 1) if seconds > 0 else None})
+        self._sd_size = _tree_size(self.station)
+        return result
+
+    def _patch(self):
+        replacements = {name: os.path.join(self.station, rel) for name, rel in _PATHS.items()}
+        replacements.update(
+            BASE_DIR=self.station,
+            camera=self.camera,
+            climate_sensor=lambda: self.sensor,
+            read_climate=self._read_climate,
+            ClimateSampler=_virtual_sampler(self.clock),
+            UsbWatcher=lambda: self.watcher,
+            clock_now=self.clock.now,
+            transfer_and_clean=self._transfer,
+            first_capture_logged=False,
+        )
+        replacements.update({name: None for name in _SERVICES})
+        self._saved = {name: getattr(main, name) for name in replacements}
+        self._orig_transfer = self._saved["transfer_and_clean"]
+        for name, value in replacements.items():
+            setattr(main, name, value)
+        self._saved_leds = led_feedback._controller
+        led_feedback._controller = self.leds
+
+    def _restore(self):
+        for name, value in self._saved.items():
+            setattr(main, name, value)
+        led_feedback._controller = self._saved_leds
+
+    # -------------------- Running --------------------
+    def run(self):
+        for folder in ("data", "images"):
+            os.makedirs(os.path.join(self.station, folder), exist_ok=True)
+        with open(os.path.join(self.station, "config.json"), "w", encoding="utf-8") as f:
+            json.dump(self.config, f)
+        self._sd_size = _tree_size(self.station)
+        self._patch()
+        io_before = _proc_io()
+        cpu_before = time.process_time()
+        wall_before = time.perf_counter()
+        stdout = sys.stdout
+        try:
+            with open(os.devnull, "w") as devnull:
+                sys.stdout = devnull   # write_log prints every line; the log file is still written
+                try:
+                    main.main()
+                except SimulationEnd:
+                    pass
+                finally:
+                    main.stop_config_sync()
+                    main.stop_storage_manager()
+                    main.stop_analyzer()
+                    main.stop_sampler()
+                    main.stop_uploader()
+                    self.leds.wait_idle(timeout=5)
+        finally:
+            sys.stdout = stdout
+            self._restore()
+        wall = time.perf_counter() - wall_before
+        cpu = time.process_time() - cpu_before
+        io_after = _proc_io()
+        self._sd_written += max(0, _tree_size(self.station) - self._sd_size)
+
+        hours = (self.end - self.clock.start) / 3600
+        copied = sum(t["bytes"] for t in self.transfers)
+        copy_seconds = sum(t["seconds"] for t in self.transfers)
+        return {
+            "simulated_hours": round(hours, 2),
+            "wall_seconds": round(wall, 2),
+            "cpu_seconds": round(cpu, 2),
+            "speedup": round(hours * 3600 / wall) if wall > 0 else None,
+            "photos": len(self.camera.captures),
+            "schedule": schedule_accuracy(self.config, self.camera.captures, self.clock.start, self.end),
+            "loop_wakeups": self.watcher.waits,
+            "timer_wakeups": self.clock.wakeups - self.watcher.waits,
+            "wakeups_per_hour": round(self.clock.wakeups / hours, 1) if hours else None,
+            "sd_bytes_written": self._sd_written,
+            "write_syscall_bytes": io_after - io_before if io_before is not None and io_after is not None else None,
+            "usb_transfers": len(self.transfers),
+            "usb_failed": sum(1 for t in self.transfers if not t["ok"]),
+            "usb_bytes": copied,
+            "usb_mb_per_s": round(copied / 1e6 / copy_seconds, 1) if copy_seconds > 0 else None,
+            "led_writes": self.leds.writes,
+        }
+
+
+def _report(r):
+    s = r["schedule"]
+    lines = [
+        f"Simulated {r['simulated_hours']:g} h in {r['wall_seconds']:g} s wall / {r['cpu_seconds']:g} s CPU "
+        f"(x{r['speedup']})",
+        f"Schedule: {s['captured']}/{s['slots']} slots captured, {s['missed']} missed, "
+        f"delay mean {s['delay_mean_s']} s, max {s['delay_max_s']} s ({r['photos']} photos)",
+        f"Wakeups: {r['loop_wakeups']} main loop + {r['timer_wakeups']} timers = {r['wakeups_per_hour']} per simulated hour",
+        f"SD card: {r['sd_bytes_written'] / 1e6:.1f} MB written"
+        + (f" (write() total incl. USB and logs: {r['write_syscall_bytes'] / 1e6:.1f} MB)"
+           if r["write_syscall_bytes"] is not None else ""),
+        f"USB: {r['usb_transfers']} transfers ({r['usb_failed']} failed), {r['usb_bytes'] / 1e6:.1f} MB"
+        + (f" at {r['usb_mb_per_s']} MB/s" if r["usb_mb_per_s"] else ""),
+        f"LED writes: {r['led_writes']}",
+    ]
+    return "\n".join(lines)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Run the station main loop on simulated hardware and time.")
+    parser.add_argument("--days", type=float, default=1.0)
+    parser.add_argument("--start", help='Simulated start, "YYYY-MM-DD HH:MM" (default: today 00:00)')
+    parser.add_argument("--photos-per-day", type=int, default=48)
+    parser.add_argument("--photo-times", help='Comma-separated "HH:MM" times (overrides --photos-per-day)')
+    parser.add_argument("--burst-count", type=int, default=1)
+    parser.add_argument("--sample-interval", type=float, default=10)
+    parser.add_argument("--aggregate-interval", type=float, default=300)
+    parser.add_argument("--no-analysis", action="store_true", help="Disable on-device analysis")
+    parser.add_argument("--usb-every", type=float, default=24.0, help="Hours between USB insertions (0 = never)")
+    parser.add_argument("--usb-minutes", type=float, default=10.0, help="Minutes the USB stays inserted")
+    parser.add_argument("--photo-kb", type=int, default=3000, help="Size of each fake photo")
+    parser.add_argument("--photo", help="Use this JPEG as every photo instead of a blank one")
+    parser.add_argument("--workdir", help="Keep station files here (default: temporary, removed)")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args(argv)
+
+    config = dict(main.default_config(), photos_per_day=args.photos_per_day, burst_count=args.burst_count,
+                  sample_interval=args.sample_interval, aggregate_interval=args.aggregate_interval,
+                  analyze_images=not args.no_analysis)
+    config.pop("photo_hour", None)
+    config.pop("photo_minute", None)
+    config.pop("photo_times", None)
+    if args.photo_times:
+        config["photo_times"] = [t.strip() for t in args.photo_times.split(",")]
+    start = datetime.strptime(args.start, "%Y-%m-%d %H:%M") if args.start else None
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="station_sim_")
+    try:
+        sim = Simulation(workdir, config, days=args.days, start=start, usb_every=args.usb_every,
+                         usb_minutes=args.usb_minutes, photo_bytes=args.photo_kb * 1000, template=args.photo)
+        results = sim.run()
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(results, indent=2) if args.json else _report(results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
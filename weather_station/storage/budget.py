@@ -0,0 +1,298 @@
+"""
+Storage budget for unattended runs: keeps images/ + data/ under a size budget (and the SD card
+above a free-space floor) so captures keep working when nobody collects the data for months.
+
+When usage passes the high-water mark, a low-priority background worker works through the
+oldest photos (never the newest keep_full_days, never flagged ones) in tiers until usage is
+back under the low-water mark. Redundant photos (dark, blank or duplicate, listed by main.py
+from analysis/frame_check.py) go first, whatever their age:
+  tier 1  re-encode at full resolution with JPEG quality RECOMPRESS_QUALITY
+  tier 2  downscale to DOWNSCALE_FACTOR of the size
+  last    delete photos that were already exported to USB (unexported photos are never deleted)
+Each photo's tier and the bytes saved are kept in storage_state.json.
+"""
+import os
+import json
+import time
+import shutil
+import threading
+from datetime import datetime
+
+cv2 = None   # imported on the first pass that needs it (slow to import on a Pi)
+_cv2_missing = False
+
+from usb.manifest import ExportManifest
+
+RECOMPRESS_QUALITY = 75
+DOWNSCALE_FACTOR = 0.5
+HIGH_WATER = 0.9    # start freeing space above this fraction of the budget
+LOW_WATER = 0.75    # stop once usage is below this fraction
+CHECK_INTERVAL = 600
+NICE = 19
+
+
+def _load_cv2():
+    """Return the cv2 module, or None without OpenCV (then only exported photos can be removed)."""
+    global cv2, _cv2_missing
+    if cv2 is None and not _cv2_missing:
+        try:
+            import cv2 as _cv2
+        except ImportError:
+            _cv2_missing = True
+            return None
+        cv2 = _cv2
+    return cv2
+
+
+_list_lock = threading.Lock()   # redundant_images.txt: appended by main.py, pruned by the worker
+
+
+def add_redundant(path, name):
+    """Append a photo name to the redundant list (dark, blank or duplicate photos; shrunk first)."""
+    with _list_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(name + "\n")
+
+
+def _dir_size(folder):
+    total = 0
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False):
+                    total += entry.stat().st_size
+    except OSError:
+        pass
+    return total
+
+
+class StorageManager:
+    def __init__(self, images_dir, data_dir, state_path, budget_bytes, min_free_bytes=512 * 1024 * 1024,
+                 keep_full_days=7, flagged_path=None, manifest_path=None, redundant_path=None):
+        self.images_dir = images_dir
+        self.data_dir = data_dir
+        self.state_path = state_path
+        self.budget_bytes = budget_bytes
+        self.min_free_bytes = min_free_bytes
+        self.keep_full_days = keep_full_days
+        self.flagged_path = flagged_path
+        self.manifest_path = manifest_path
+        self.redundant_path = redundant_path
+        # Held while one photo is rewritten or deleted; main.py holds it during a USB transfer so
+        # files do not change under the copy (the transfer waits for one photo, not a whole pass)
+        self.busy = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._manifest_seen = None
+        self.state = self._load_state()
+
+    # -------------------- State / stats --------------------
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault("tiers", {})
+        state.setdefault("bytes_saved", 0)
+        state.setdefault("recompressed", 0)
+        state.setdefault("downscaled", 0)
+        state.setdefault("deleted", 0)
+        return state
+
+    def _save_state(self):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.state_path)
+
+    def usage(self):
+        return _dir_size(self.images_dir) + _dir_size(self.data_dir)
+
+    def free_bytes(self):
+        try:
+            return shutil.disk_usage(self.images_dir).free
+        except OSError:
+            return None
+
+    def stats(self):
+        return {
+            "usage_bytes": self.usage(),
+            "budget_bytes": self.budget_bytes,
+            "free_bytes": self.free_bytes(),
+            "bytes_saved": self.state["bytes_saved"],
+            "recompressed": self.state["recompressed"],
+            "downscaled": self.state["downscaled"],
+            "deleted": self.state["deleted"],
+        }
+
+    def _over(self, fraction, saved=0, usage=None):
+        """True if over fraction of the budget (usage minus `saved` bytes) or below the free-space floor."""
+        free = self.free_bytes()
+        if free is not None and free < self.min_free_bytes:
+            return True
+        if usage is None:
+            usage = self.usage()
+        return usage - saved > self.budget_bytes * fraction
+
+    # -------------------- Candidates --------------------
+    @staticmethod
+    def _names(path):
+        """File names listed one per line in path (empty if there is no such file)."""
+        if not path or not os.path.isfile(path):
+            return set()
+        with open(path, "r", encoding="utf-8") as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def _flagged(self):
+        return self._names(self.flagged_path)
+
+    def _prune_redundant(self):
+        """Rewrite the redundant list without duplicates and without photos that no longer exist."""
+        if not self.redundant_path:
+            return
+        with _list_lock:
+            listed = self._names(self.redundant_path)
+            if not listed:
+                return
+            keep = sorted(listed & set(os.listdir(self.images_dir)))
+            tmp = self.redundant_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(name + "\n" for name in keep)
+            os.replace(tmp, self.redundant_path)
+
+    def _candidates(self):
+        """Redundant photos, then photos old enough to shrink; oldest first (names are YYYYMMDD_HHMMSS*.jpg)."""
+        cutoff = time.time() - self.keep_full_days * 86400
+        flagged = self._flagged()
+        redundant = self._names(self.redundant_path)
+        first, names = [], []
+        for name in sorted(os.listdir(self.images_dir)):
+            path = os.path.join(self.images_dir, name)
+            if not name.lower().endswith(".jpg") or name in flagged or not os.path.isfile(path):
+                continue
+            if name in redundant:
+                first.append(name)
+            elif os.path.getmtime(path) < cutoff:
+                names.append(name)
+        return first + names
+
+    # -------------------- Tiers --------------------
+    def _manifest_signature(self):
+        try:
+            st = os.stat(self.manifest_path)
+            return st.st_size, st.st_mtime_ns
+        except (OSError, TypeError):
+            return None
+
+    def _step(self, action, name, manifest, *args):
+        """Run one photo's rewrite / delete under the busy lock; return bytes saved."""
+        with self.busy:
+            if not os.path.isfile(os.path.join(self.images_dir, name)):
+                return 0   # moved off by a USB transfer since the candidates were listed
+            if manifest is not None and self._manifest_seen != self._manifest_signature():
+                manifest.load()   # a USB transfer recorded exports since it was read
+            try:
+                return action(name, *args, manifest)
+            finally:
+                self._manifest_seen = self._manifest_signature()
+
+    def _rewrite(self, name, tier, manifest):
+        """Re-encode one photo for the given tier; return bytes saved (0 if not smaller)."""
+        path = os.path.join(self.images_dir, name)
+        img = cv2.imread(path)
+        if img is None:
+            return 0
+        if tier == 2:
+            img = cv2.resize(img, None, fx=DOWNSCALE_FACTOR, fy=DOWNSCALE_FACTOR, interpolation=cv2.INTER_AREA)
+        tmp = path + ".tmp.jpg"
+        if not cv2.imwrite(tmp, img, [cv2.IMWRITE_JPEG_QUALITY, RECOMPRESS_QUALITY]):
+            return 0
+        old = os.stat(path)
+        new_size = os.path.getsize(tmp)
+        self.state["tiers"][name] = tier
+        if new_size >= old.st_size:
+            os.remove(tmp)
+            return 0
+        os.utime(tmp, ns=(old.st_atime_ns, old.st_mtime_ns))  # keep capture time
+        os.replace(tmp, path)
+        if manifest is not None:
+            manifest.keep_exported(f"images/{name}", os.stat(path), f"tier{tier}")
+        return old.st_size - new_size
+
+    def _delete_exported(self, name, manifest):
+        path = os.path.join(self.images_dir, name)
+        if manifest is None or not manifest.is_exported(f"images/{name}", os.stat(path)):
+            return 0
+        size = os.path.getsize(path)
+        os.remove(path)
+        self.state["tiers"].pop(name, None)
+        self.state["deleted"] += 1
+        return size
+
+    def run_pass(self):
+        """Free space if over the high-water mark; return bytes saved in this pass."""
+        self._prune_redundant()
+        usage = self.usage()  # measured once, then reduced by what each step saves
+        if not self._over(HIGH_WATER, usage=usage):
+            return 0
+        saved = 0
+        with self.busy:
+            manifest = ExportManifest(self.manifest_path) if self.manifest_path else None
+            self._manifest_seen = self._manifest_signature()
+        # Forget photos that were exported and removed since the last pass
+        existing = set(os.listdir(self.images_dir))
+        tiers = self.state["tiers"] = {k: v for k, v in self.state["tiers"].items() if k in existing}
+        steps = [(1, "recompressed"), (2, "downscaled")] if _load_cv2() is not None else []
+        for tier, counter in steps:
+            for name in self._candidates():
+                if not self._over(LOW_WATER, saved, usage) or self._stop.is_set():
+                    break
+                if tiers.get(name, 0) >= tier:
+                    continue
+                gained = self._step(self._rewrite, name, manifest, tier)
+                if gained:
+                    self.state[counter] += 1
+                    saved += gained
+        # Last resort: photos already safe on a USB drive
+        for name in self._candidates():
+            if not self._over(LOW_WATER, saved, usage) or self._stop.is_set():
+                break
+            saved += self._step(self._delete_exported, name, manifest)
+        self._prune_redundant()   # photos deleted in this pass
+        self.state["bytes_saved"] += saved
+        self.state["last_pass"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._save_state()
+        return saved
+
+    # -------------------- Background worker --------------------
+    def _run(self):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), NICE)
+        except (AttributeError, OSError):
+            pass
+        while not self._stop.is_set():
+            try:
+                self.run_pass()
+            except Exception:
+                pass  # retry on the next interval
+            self._wake.wait(CHECK_INTERVAL)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="storage-budget", daemon=True)
+            self._thread.start()
+
+    def request_check(self):
+        """Run a pass soon (e.g. after a capture) instead of waiting for the interval."""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
@@ -0,0 +1,202 @@
+"""
+Compact append-only binary climate log: fixed-width records sorted by time.
+
+File layout: 16-byte header (magic, version, record size), then records of
+  timestamp (float64, Unix seconds), temperature (float32, °C), pressure (float32, hPa),
+  humidity (float32, %RH), crc32 of the preceding 20 bytes (uint32) – 24 bytes per sample.
+Because records are fixed width and in time order, the record number is the time index:
+a range query binary-searches timestamps and seeks straight to the first matching offset.
+A crash can only leave a torn record at the end; it is cut off the next time the log is opened.
+Opened with read_only=True (as the CSV converter does) the file is never created or changed: a torn
+or bad-checksum tail is only skipped, so a log the station is still writing can be read safely.
+
+Convert to CSV on a computer:  python -m storage.climate_store data/climate.bin climate.csv
+"""
+import os
+import csv
+import sys
+import struct
+import zlib
+from datetime import datetime
+
+MAGIC = b"CLIM"
+VERSION = 1
+HEADER = struct.Struct("<4sHH8x")
+RECORD = struct.Struct("<dfffI")
+_BODY = struct.Struct("<dfff")
+
+
+def _pack(timestamp, temperature, pressure, humidity):
+    body = _BODY.pack(timestamp, temperature, pressure, humidity)
+    return body + struct.pack("<I", zlib.crc32(body))
+
+
+class ClimateStore:
+    """Append-only binary climate log with O(log n) time-range reads."""
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.read_only = read_only
+        self._fd = None
+        self._count = 0
+        self._last_ts = None
+        self._open()
+
+    # -------------------- Open / recover --------------------
+    def _open(self):
+        if self.read_only:
+            fd = os.open(self.path, os.O_RDONLY)   # FileNotFoundError if missing
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(fd).st_size
+        if size < HEADER.size and self.read_only:
+            os.close(fd)
+            raise ValueError(f"{self.path} is not a climate log (no header)")
+        if size < HEADER.size:
+            # New file (or a crash before the header was complete)
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, HEADER.pack(MAGIC, VERSION, RECORD.size), 0)
+            os.fsync(fd)
+            size = HEADER.size
+        else:
+            magic, version, rec_size = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+            if magic != MAGIC or rec_size != RECORD.size:
+                os.close(fd)
+                raise ValueError(f"{self.path} is not a climate log (version {version})")
+        count = (size - HEADER.size) // RECORD.size
+        # Drop a torn tail record and any trailing records whose checksum does not match
+        while count and self._read_raw(fd, count - 1) is None:
+            count -= 1
+        if HEADER.size + count * RECORD.size != size and not self.read_only:
+            os.ftruncate(fd, HEADER.size + count * RECORD.size)
+            os.fsync(fd)
+        self._fd = fd
+        self._count = count
+        self._last_ts = self._timestamp(count - 1) if count else None
+
+    @staticmethod
+    def _read_raw(fd, index):
+        data = os.pread(fd, RECORD.size, HEADER.size + index * RECORD.size)
+        if len(data) != RECORD.size:
+            return None
+        *values, crc = RECORD.unpack(data)
+        if zlib.crc32(data[:_BODY.size]) != crc:
+            return None
+        return tuple(values)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self._count
+
+    # -------------------- Append --------------------
+    def append_many(self, samples, sync=True):
+        """
+        Append (timestamp, temperature, pressure, humidity) samples in one write.
+        Samples older than the last stored one are skipped (log stays sorted); returns number written.
+        """
+        if self.read_only:
+            raise OSError(f"{self.path} is open read-only")
+        if os.fstat(self._fd).st_nlink == 0:
+            # File was exported and removed (USB transfer): start a fresh log at the same path
+            self.close()
+            self._open()
+        chunks = []
+        last = self._last_ts
+        for ts, temp, pres, hum in samples:
+            if last is not None and ts < last:
+                continue
+            chunks.append(_pack(ts, temp, pres, hum))
+            last = ts
+        if not chunks:
+            return 0
+        offset = HEADER.size + self._count * RECORD.size
+        data = b"".join(chunks)
+        written = os.pwrite(self._fd, data, offset)
+        if written != len(data):
+            # Short write (disk full): leave the file at the last whole record
+            os.ftruncate(self._fd, offset)
+            raise OSError("short write to climate log")
+        if sync:
+            os.fsync(self._fd)
+        self._count += len(chunks)
+        self._last_ts = last
+        return len(chunks)
+
+    def append(self, timestamp, temperature, pressure, humidity, sync=True):
+        return self.append_many([(timestamp, temperature, pressure, humidity)], sync=sync)
+
+    # -------------------- Read --------------------
+    def _timestamp(self, index):
+        return struct.unpack("<d", os.pread(self._fd, 8, HEADER.size + index * RECORD.size))[0]
+
+    def _bisect(self, ts):
+        """Index of the first record with timestamp >= ts."""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._timestamp(mid) < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def range(self, start=None, end=None, chunk_records=4096):
+        """Yield (timestamp, temperature, pressure, humidity) with start <= timestamp < end."""
+        first = 0 if start is None else self._bisect(start)
+        last = self._count if end is None else self._bisect(end)
+        for i in range(first, last, chunk_records):
+            n = min(chunk_records, last - i)
+            data = os.pread(self._fd, n * RECORD.size, HEADER.size + i * RECORD.size)
+            for ts, temp, pres, hum, _crc in RECORD.iter_unpack(data):
+                yield ts, temp, pres, hum
+
+    def last(self):
+        if not self._count:
+            return None
+        return self._read_raw(self._fd, self._count - 1)
+
+
+def to_csv(log_path, csv_path, start=None, end=None):
+    """Write the (optionally time-limited) binary log as CSV; return number of rows."""
+    rows = 0
+    with ClimateStore(log_path, read_only=True) as store, open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "temperature", "pressure", "humidity"])
+        for ts, temp, pres, hum in store.range(start, end):
+            writer.writerow([
+                datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"),
+                round(temp, 2), round(pres, 2), round(hum, 2),
+            ])
+            rows += 1
+    return rows
+
+
+def _parse_time(text):
+    return datetime.strptime(text, "%Y-%m-%d %H:%M:%S" if " " in text else "%Y-%m-%d").timestamp()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 5):
+        print("Usage: python -m storage.climate_store LOG.bin OUT.csv [START END]")
+        print('  START/END as "YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS"')
+        sys.exit(1)
+    start = end = None
+    if len(sys.argv) == 5:
+        start, end = _parse_time(sys.argv[3]), _parse_time(sys.argv[4])
+    try:
+        n = to_csv(sys.argv[1], sys.argv[2], start, end)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Cannot convert {sys.argv[1]}: {e}")
+    print(f"Wrote {n} rows to {sys.argv[2]}")
@@ -0,0 +1,293 @@
+"""
+Upload client: sends the outbox (upload/outbox.py) to the web server over one reused keep-alive
+HTTP connection, on a background thread.
+
+- Records: several gzip batches are sent per request (up to MAX_BATCH_BYTES), as they are
+  stored, without recompressing. The server skips batches it already has, so a retry after a
+  lost reply never duplicates rows.
+- Photos: sent in CHUNK_SIZE pieces. Before sending, the client asks the server how much of the
+  photo it already has (HEAD), so an upload cut off by a dropped link continues where it stopped.
+  Photos are identified by sha256, which is checked by the server after the last chunk.
+- When the server cannot be reached, retries back off exponentially (with jitter) from
+  BACKOFF_MIN up to BACKOFF_MAX seconds; the outbox simply keeps growing meanwhile.
+
+See upload/server.py for the protocol and a local stand-in server.
+Load test on one machine:  python -m upload.client --images images/ --records 10000
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+from .outbox import Outbox
+
+CHUNK_SIZE = 256 * 1024
+MAX_BATCH_BYTES = 256 * 1024
+BACKOFF_MIN = 5
+BACKOFF_MAX = 900
+POLL_INTERVAL = 60
+TIMEOUT = 30
+
+
+class UploadError(Exception):
+    """The server rejected a request (as opposed to the link being down)."""
+
+
+class Backoff:
+    """Exponential back-off with full jitter: each failure doubles the ceiling up to max_delay."""
+
+    def __init__(self, min_delay=BACKOFF_MIN, max_delay=BACKOFF_MAX):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.failures = 0
+
+    def failure(self):
+        """Record a failure and return how long to wait before the next attempt."""
+        self.failures += 1
+        ceiling = min(self.max_delay, self.min_delay * 2 ** (self.failures - 1))
+        return random.uniform(self.min_delay, max(self.min_delay, ceiling))
+
+    def reset(self):
+        self.failures = 0
+
+
+def _sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class Uploader:
+    def __init__(self, outbox, url, station_id="default", token=None, chunk_size=CHUNK_SIZE,
+                 max_batch_bytes=MAX_BATCH_BYTES, timeout=TIMEOUT, poll_interval=POLL_INTERVAL,
+                 backoff=None):
+        self.outbox = outbox
+        parts = urlsplit(url)
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname
+        self._port = parts.port
+        self._prefix = parts.path.rstrip("/")
+        self.station_id = station_id
+        self.token = token
+        self.chunk_size = chunk_size
+        self.max_batch_bytes = max_batch_bytes
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.backoff = backoff or Backoff()
+        self._conn = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.sent_rows = 0
+        self.sent_images = 0
+        self.sent_bytes = 0
+        self.retries = 0      # failed requests (each is sent again: right away or on the next pass)
+        self.last_error = None
+
+    # -------------------- HTTP --------------------
+    def _connection(self):
+        if self._conn is None:
+            cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            self._conn = cls(self._host, self._port, timeout=self.timeout)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _request(self, method, path, body=None, headers=None):
+        """Send one request on the shared connection; return (status, headers, body)."""
+        all_headers = {"X-Station": self.station_id}
+        if self.token:
+            all_headers["Authorization"] = f"Bearer {self.token}"
+        all_headers.update(headers or {})
+        # A kept-alive connection may have been closed by the server while idle: retry once on a new one
+        for attempt in (0, 1):
+            reused = self._conn is not None
+            conn = self._connection()
+            try:
+                conn.request(method, self._prefix + path, body=body, headers=all_headers)
+                resp = conn.getresponse()
+                data = resp.read()   # always read fully so the connection can be reused
+            except (OSError, http.client.HTTPException):
+                self.close()
+                self.retries += 1
+                if reused and attempt == 0:
+                    continue
+                raise
+            if resp.will_close:
+                self.close()
+            self.sent_bytes += len(body or b"")
+            return resp.status, resp.headers, data
+
+    # -------------------- Records --------------------
+    def _send_records(self, entries):
+        body = b"".join(e.read_bytes() for e in entries)
+        status, _, data = self._request("POST", "/api/records", body, {
+            "Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"})
+        if status != 200:
+            raise UploadError(f"records rejected: HTTP {status}")
+        self.sent_rows += json.loads(data or b"{}").get("accepted", 0)
+        for e in entries:
+            e.done()
+
+    # -------------------- Images --------------------
+    def _send_image(self, entry):
+        info = entry.read_json()
+        path = info["path"]
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            entry.done()   # removed locally (USB clean / storage budget) before it could be sent
+            return
+        # sha256 is cached in the entry; recomputed if the photo was rewritten (e.g. recompressed)
+        if info.get("size") != st.st_size or info.get("mtime_ns") != st.st_mtime_ns or not info.get("sha256"):
+            info.update(sha256=_sha256_file(path), size=st.st_size, mtime_ns=st.st_mtime_ns)
+            entry.update_json(info)
+        url = f"/api/images/{info['sha256']}"
+        status, headers, _ = self._request("HEAD", url)
+        if status != 200:
+            raise UploadError(f"image status rejected: HTTP {status}")
+        if headers.get("Upload-Complete") == "1":
+            entry.done()
+            return
+        offset = int(headers.get("Upload-Offset") or 0)
+        total = st.st_size
+        with open(path, "rb") as f:
+            while True:
+                f.seek(offset)
+                chunk = f.read(self.chunk_size)
+                status, headers, _ = self._request("PATCH", url, chunk, {
+                    "Content-Type": "application/offset+octet-stream",
+                    "Upload-Offset": str(offset), "Upload-Length": str(total), "X-Name": info["name"]})
+                if status == 201:
+                    break
+                if status in (204, 409):
+                    # 409: the server has a different amount (e.g. a reply was lost); continue from its offset
+                    offset = int(headers.get("Upload-Offset") or 0)
+                    continue
+                if status == 422:
+                    # Photo changed while uploading: hash again next time
+                    info.pop("sha256", None)
+                    entry.update_json(info)
+                raise UploadError(f"image rejected: HTTP {status}")
+        self.sent_images += 1
+        entry.done()
+
+    # -------------------- Draining --------------------
+    def run_once(self):
+        """Send everything in the outbox. Raises on the first failure (entries already sent are removed)."""
+        entries = self.outbox.entries()
+        batch, batch_bytes = [], 0
+        for entry in entries + [None]:
+            if entry is not None and entry.is_records:
+                size = entry.size()
+                if batch and batch_bytes + size > self.max_batch_bytes:
+                    self._send_records(batch)
+                    batch, batch_bytes = [], 0
+                batch.append(entry)
+                batch_bytes += size
+                continue
+            # Keep order: flush pending records before the next photo
+            if batch:
+                self._send_records(batch)
+                batch, batch_bytes = [], 0
+            if entry is not None and entry.is_image:
+                self._send_image(entry)
+        return len(entries)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                self.backoff.reset()
+                self.last_error = None
+                delay = self.poll_interval
+            except (OSError, http.client.HTTPException, UploadError, ValueError) as e:
+                self.close()
+                self.last_error = str(e)
+                delay = self.backoff.failure()
+            self._wake.wait(delay)
+            self._wake.clear()
+        self.close()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="uploader", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """Try to send now (e.g. right after new data was queued), unless backing off."""
+        if not self.backoff.failures:
+            self._wake.set()
+
+    def stop(self, timeout=TIMEOUT):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def main(argv=None):
+    """Load test: queue photos and synthetic records, upload them and report throughput."""
+    parser = argparse.ArgumentParser(description="Upload load test against a (local) upload server.")
+    parser.add_argument("--url", help="Server URL (default: start upload.server locally)")
+    parser.add_argument("--images", help="Folder of photos to upload")
+    parser.add_argument("--records", type=int, default=1000, help="Number of synthetic climate rows")
+    parser.add_argument("--batch-rows", type=int, default=12, help="Rows per outbox batch")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Local server only: drop this fraction of requests")
+    args = parser.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="upload_test_")
+    server = None
+    url = args.url
+    if not url:
+        from .server import serve_in_thread
+        server = serve_in_thread(os.path.join(work, "server"), fail_rate=args.fail_rate)
+        url = server.url
+    outbox = Outbox(os.path.join(work, "outbox"))
+    t0 = time.time()
+    for start in range(0, args.records, args.batch_rows):
+        rows = [{"interval_start": t0 + 300 * i, "temperature_mean": 20.0, "pressure_mean": 1013.0,
+                 "humidity_mean": 50.0} for i in range(start, min(args.records, start + args.batch_rows))]
+        outbox.add_records("climate_agg", rows)
+    image_bytes = 0
+    if args.images:
+        for name in sorted(os.listdir(args.images)):
+            if name.lower().endswith(".jpg"):
+                outbox.add_image(os.path.join(args.images, name))
+                image_bytes += os.path.getsize(os.path.join(args.images, name))
+    queued = len(outbox)
+
+    uploader = Uploader(outbox, url, station_id="loadtest", backoff=Backoff(0.01, 0.5))
+    started = time.monotonic()
+    while len(outbox):
+        try:
+            uploader.run_once()
+        except (OSError, http.client.HTTPException, UploadError):
+            uploader.close()
+            time.sleep(uploader.backoff.failure())
+    seconds = time.monotonic() - started
+    uploader.close()
+    print(f"{queued} outbox entries in {seconds:.2f}s: {uploader.sent_rows} rows, {uploader.sent_images} photos "
+          f"({image_bytes / 1e6:.1f} MB), {uploader.sent_bytes / 1e6 / max(seconds, 1e-9):.1f} MB/s on the wire, "
+          f"{uploader.retries} retries")
+    if server is not None:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+Remote configuration: poll the server's GET /api/config on a background thread and apply changes
+to config.json without a restart.
+
+Requests are conditional (If-None-Match with the last ETag, If-Modified-Since with the last
+Last-Modified), so while nothing changed each poll is a single 304 reply with no body. The ETag
+survives restarts in a small state file next to config.json.
+
+The server document is a delta: only the keys it contains are changed, a key set to null is
+removed, everything else in the local config.json is kept. The merged config is validated as a
+whole and written atomically (temp file + fsync + rename); an invalid document is rejected and
+the local config stays as it was. Changed keys are passed to on_change so main.py can reschedule
+at once.
+"""
+import os
+import json
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+from .client import Backoff, TIMEOUT
+
+POLL_INTERVAL = 300
+MAX_BURST_COUNT = 20      # photos per scheduled time
+MAX_BURST_SECONDS = 120   # a burst runs in the main loop: (burst_count - 1) * burst_interval
+
+_NUMBERS = {   # key -> minimum value
+    "photos_per_day": 1, "photo_hour": 0, "photo_minute": 0, "burst_count": 1, "burst_interval": 0,
+    "sample_interval": 0, "aggregate_interval": 0, "storage_budget_mb": 0, "min_free_mb": 0,
+    "keep_full_days": 0, "config_poll_interval": 10,
+}
+_INTEGERS = ("photos_per_day", "photo_hour", "photo_minute", "burst_count")
+_MAXIMUM = {"photo_hour": 23, "photo_minute": 59, "burst_count": MAX_BURST_COUNT,
+            "burst_interval": MAX_BURST_SECONDS}
+_BOOLS = ("enabled", "usb_clean", "analyze_images", "frame_check")
+_STRINGS = ("station_id", "upload_url", "upload_token")
+
+
+def _valid_time(value):
+    if not isinstance(value, str) or ":" not in value:
+        return False
+    h, _, m = value.strip().partition(":")
+    try:
+        return 0 <= int(h) <= 23 and 0 <= int(m) <= 59
+    except ValueError:
+        return False
+
+
+def validate_config(config):
+    """Return a list of problems with config (empty if it can be applied). Unknown keys are allowed."""
+    if not isinstance(config, dict):
+        return ["config must be a JSON object"]
+    errors = []
+    for key, minimum in _NUMBERS.items():
+        value = config.get(key)
+        if value is None:
+            continue
+        kind = "a whole number" if key in _INTEGERS else "a number"
+        maximum = _MAXIMUM.get(key)
+        # Type first: a string or float must not reach the comparisons (or range() in the schedule)
+        if (isinstance(value, bool) or not isinstance(value, int if key in _INTEGERS else (int, float))
+                or value < minimum or (maximum is not None and value > maximum)):
+            limits = f"{minimum}-{maximum}" if maximum is not None else f">= {minimum}"
+            errors.append(f"{key} must be {kind} {limits}")
+    if not any(e.startswith("burst_") for e in errors):
+        # Both values are valid numbers here; together they must not stall the main loop
+        count, interval = config.get("burst_count") or 1, config.get("burst_interval") or 0
+        if (count - 1) * interval > MAX_BURST_SECONDS:
+            errors.append(f"a burst must take at most {MAX_BURST_SECONDS} s ((burst_count - 1) * burst_interval)")
+    for key in _BOOLS:
+        if key in config and not isinstance(config[key], bool):
+            errors.append(f"{key} must be true or false")
+    for key in _STRINGS:
+        if config.get(key) is not None and not isinstance(config[key], str):
+            errors.append(f"{key} must be a string")
+    times = config.get("photo_times")
+    if times is not None and (not isinstance(times, list) or not all(_valid_time(t) for t in times)):
+        errors.append('photo_times must be a list of "HH:MM" times')
+    return errors
+
+
+def apply_delta(config, delta):
+    """Return (merged config, sorted list of changed keys); None values delete keys."""
+    merged = dict(config)
+    for key, value in delta.items():
+        if value is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = value
+    changed = sorted(k for k in set(config) | set(merged) if config.get(k, ...) != merged.get(k, ...))
+    return merged, changed
+
+
+def _write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class ConfigSync:
+    def __init__(self, url, config_path, station_id="default", token=None, interval=POLL_INTERVAL,
+                 on_change=None, on_error=None, state_path=None, timeout=TIMEOUT, backoff=None):
+        parts = urlsplit(url)
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path.rstrip("/") + "/api/config"
+        self.config_path = config_path
+        self.state_path = state_path or os.path.splitext(config_path)[0] + "_sync.json"
+        self.station_id = station_id
+        self.token = token
+        self.interval = interval
+        self.on_change = on_change      # on_change(changed_keys, config), on the sync thread
+        self.on_error = on_error        # on_error(message) for rejected documents
+        self.timeout = timeout
+        self.backoff = backoff or Backoff()
+        self._conn = None
+        self._lock = threading.Lock()   # poll_once may be called from the thread and by hand
+        self._stop = threading.Event()
+        self._thread = None
+        self.state = self._load_state()
+        self.last_error = None
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _request(self, headers):
+        if self._conn is None:
+            cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            self._conn = cls(self._host, self._port, timeout=self.timeout)
+        try:
+            self._conn.request("GET", self._path, headers=headers)
+            resp = self._conn.getresponse()
+            data = resp.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        if resp.will_close:
+            self.close()
+        return resp.status, resp.headers, data
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def poll_once(self):
+        """
+        Fetch the remote config if it changed and apply it. Return the list of changed keys
+        (empty if unchanged or nothing to change). Raises OSError/HTTPException if unreachable
+        and ValueError if the document was rejected.
+        """
+        with self._lock:
+            headers = {"X-Station": self.station_id}
+            if self.token:
+                headers["Authorization"] = f"Bearer {self.token}"
+            if self.state.get("etag"):
+                headers["If-None-Match"] = self.state["etag"]
+            if self.state.get("last_modified"):
+                headers["If-Modified-Since"] = self.state["last_modified"]
+            status, resp_headers, data = self._request(headers)
+            if status in (304, 404):
+                return []    # unchanged, or no remote config for this station
+            if status != 200:
+                raise OSError(f"config request failed: HTTP {status}")
+            try:
+                delta = json.loads(data.decode("utf-8"))
+            except ValueError:
+                raise ValueError("remote config is not valid JSON")
+            if not isinstance(delta, dict):
+                raise ValueError("remote config must be a JSON object")
+            try:
+                with open(self.config_path, "r", encoding="utf-8") as f:
+                    current = json.load(f)
+            except (OSError, ValueError):
+                current = {}
+            merged, changed = apply_delta(current, delta)
+            errors = validate_config(merged)
+            if changed and not errors:
+                _write_json(self.config_path, merged)
+            # Remember the version once handled (applied or rejected): it is not fetched again until
+            # it changes on the server. A failed write raises before this, so it is retried.
+            self.state = {"etag": resp_headers.get("ETag"), "last_modified": resp_headers.get("Last-Modified")}
+            _write_json(self.state_path, self.state)
+            if errors:
+                raise ValueError("remote config rejected: " + "; ".join(errors))
+        if changed and self.on_change:
+            self.on_change(changed, merged)
+        return changed
+
+    # -------------------- Background polling --------------------
+    def _run(self):
+        while not self._stop.is_set():
+            delay = self.interval
+            try:
+                self.poll_once()
+                self.backoff.reset()
+                self.last_error = None
+            except ValueError as e:
+                # The server answered but the document is unusable: report and wait for a new version
+                self.last_error = str(e)
+                if self.on_error:
+                    self.on_error(self.last_error)
+            except (OSError, http.client.HTTPException) as e:
+                self.last_error = str(e)
+                delay = min(self.interval, self.backoff.failure())
+            except Exception as e:
+                # Anything unexpected: report it and keep polling, so remote config keeps working
+                self.last_error = f"{type(e).__name__}: {e}"
+                if self.on_error:
+                    self.on_error(self.last_error)
+                delay = min(self.interval, self.backoff.failure())
+            self._stop.wait(delay)
+        self.close()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="config-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=TIMEOUT):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,115 @@
+"""
+Persistent upload outbox: everything waiting to go to the web server, kept on the SD card so a
+reboot or a week without network loses nothing.
+
+One file per entry in the outbox folder, named <time_ns>-<kind>.<ext> so a directory listing
+is the queue order:
+  records  gzip-compressed JSON lines, one batch of rows per file (e.g. the sampler's aggregates)
+  image    small JSON file pointing at a photo in images/ (the photo itself is not copied)
+Entries are written to a temporary file, fsynced and renamed, so a power cut leaves either the
+whole entry or nothing. An entry is deleted once the server has acknowledged it.
+Each gzip batch is a complete gzip member, so several batches can be sent as one request body
+by simply concatenating the files.
+"""
+import os
+import gzip
+import json
+import time
+import threading
+
+RECORDS_EXT = ".jsonl.gz"
+IMAGE_EXT = ".image.json"
+
+
+class OutboxEntry:
+    def __init__(self, outbox, name):
+        self.outbox = outbox
+        self.name = name
+        self.path = os.path.join(outbox.path, name)
+
+    @property
+    def batch_id(self):
+        return self.name.split(".", 1)[0]
+
+    @property
+    def is_records(self):
+        return self.name.endswith(RECORDS_EXT)
+
+    @property
+    def is_image(self):
+        return self.name.endswith(IMAGE_EXT)
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def read_bytes(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def read_json(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def update_json(self, data):
+        """Rewrite an image entry (e.g. to cache the photo's sha256)."""
+        self.outbox._write(self.name, json.dumps(data).encode("utf-8"))
+
+    def done(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class Outbox:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._last_ns = 0
+        # Leftovers from a crash between write and rename
+        for name in os.listdir(path):
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(path, name))
+
+    def _new_id(self, kind):
+        with self._lock:
+            # Strictly increasing even if two entries are added within one clock tick
+            ns = max(time.time_ns(), self._last_ns + 1)
+            self._last_ns = ns
+        return f"{ns:020d}-{kind}"
+
+    def _write(self, name, data):
+        tmp = os.path.join(self.path, name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.path, name))
+
+    def add_records(self, kind, rows):
+        """Queue rows (list of dicts) as one compressed batch; return the batch id."""
+        if not rows:
+            return None
+        batch_id = self._new_id(kind)
+        lines = "".join(json.dumps({"batch": batch_id, "kind": kind, "row": row}) + "\n" for row in rows)
+        self._write(batch_id + RECORDS_EXT, gzip.compress(lines.encode("utf-8"), compresslevel=6))
+        return batch_id
+
+    def add_image(self, image_path):
+        """Queue a photo for upload; the file is read from image_path when it is sent."""
+        batch_id = self._new_id("image")
+        entry = {"path": os.path.abspath(image_path), "name": os.path.basename(image_path)}
+        self._write(batch_id + IMAGE_EXT, json.dumps(entry).encode("utf-8"))
+        return batch_id
+
+    def entries(self):
+        """Pending entries, oldest first."""
+        names = sorted(n for n in os.listdir(self.path) if n.endswith((RECORDS_EXT, IMAGE_EXT)))
+        return [OutboxEntry(self, n) for n in names]
+
+    def __len__(self):
+        return len(self.entries())
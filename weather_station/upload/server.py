@@ -0,0 +1,322 @@
+"""
+Reference upload server: a small stand-in for the web server the station uploads to, so the whole
+upload path (outbox, batching, resumable images, back-off) can be run and load-tested on one
+Linux machine without any real network.
+
+Protocol (HTTP/1.1 keep-alive, optional "Authorization: Bearer <token>", station in X-Station):
+  POST  /api/records          body: concatenated gzip members of JSON lines {"batch", "kind", "row"}
+                              (Content-Encoding: gzip). Batches already stored are skipped, so a
+                              retried request never duplicates rows. Reply: JSON counts.
+  HEAD  /api/images/<sha256>  Upload-Offset: bytes received so far; Upload-Complete: 1 when stored.
+  PATCH /api/images/<sha256>  one chunk; headers Upload-Offset (must equal the bytes received),
+                              Upload-Length (total size) and X-Name (file name). The last chunk
+                              is checked against the sha256 before the photo is stored.
+                              409 + Upload-Offset if the offset does not match.
+  GET   /api/config           the station's config delta: ROOT/<station>/config.json, else
+                              ROOT/config.json (404 if neither). ETag / Last-Modified are sent and
+                              If-None-Match / If-Modified-Since answered with 304 Not Modified.
+
+Files land under ROOT/<station>/: records/<kind>.jsonl, images/<name>, batches.txt.
+To change a station's config, edit ROOT/<station>/config.json; it is served on the next poll.
+
+Run:  python -m upload.server --root /tmp/upload_root --port 8080 [--token T] [--fail-rate 0.1]
+--fail-rate drops that fraction of requests without a reply, to exercise resume and back-off.
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import random
+import hashlib
+import argparse
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MAX_BODY = 64 * 1024 * 1024
+_SAFE = re.compile(r"[^A-Za-z0-9._-]")
+_SHA = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _safe_name(value, default):
+    value = _SAFE.sub("_", os.path.basename(value or "")).lstrip(".")
+    return value or default
+
+
+class UploadHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive: the station reuses one connection
+    server_version = "StationUpload/1"
+
+    # -------------------- Helpers --------------------
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            raise ValueError("body too large")
+        return self.rfile.read(length) if length else b""
+
+    def _reply(self, status, data=None, headers=None):
+        payload = json.dumps(data).encode("utf-8") if data is not None else b""
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        if payload:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if payload and self.command != "HEAD":
+            self.wfile.write(payload)
+
+    def _station_dir(self):
+        station = _safe_name(self.headers.get("X-Station"), "default")
+        path = os.path.join(self.server.root, station)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _begin(self):
+        """Read the body and apply auth / fault injection; return the body or None if handled."""
+        try:
+            body = self._body()
+        except ValueError:
+            self.close_connection = True
+            self._reply(413, {"error": "body too large"})
+            return None
+        if self.server.fail_rate and random.random() < self.server.fail_rate:
+            self.close_connection = True   # simulate a dropped link: no reply at all
+            return None
+        if self.server.token and self.headers.get("Authorization") != f"Bearer {self.server.token}":
+            self._reply(401, {"error": "unauthorized"})
+            return None
+        return body
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    # -------------------- Records --------------------
+    def do_POST(self):
+        body = self._begin()
+        if body is None:
+            return
+        if self.path != "/api/records":
+            self._reply(404, {"error": "not found"})
+            return
+        try:
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            lines = [json.loads(line) for line in body.decode("utf-8").splitlines() if line.strip()]
+        except (OSError, EOFError, ValueError):
+            self._reply(400, {"error": "bad records body"})
+            return
+        self._reply(200, self.server.store_records(self._station_dir(), lines))
+
+    # -------------------- Images --------------------
+    def _image_paths(self):
+        sha = self.path.rsplit("/", 1)[-1]
+        if not self.path.startswith("/api/images/") or not _SHA.match(sha):
+            return None, None, None
+        uploads = os.path.join(self._station_dir(), "uploads")
+        os.makedirs(uploads, exist_ok=True)
+        return sha, os.path.join(uploads, sha + ".part"), os.path.join(uploads, sha + ".done")
+
+    def do_HEAD(self):
+        if self._begin() is None:
+            return
+        sha, part, done = self._image_paths()
+        if sha is None:
+            self._reply(404)
+        elif os.path.isfile(done):
+            self._reply(200, headers={"Upload-Complete": 1, "Upload-Offset": os.path.getsize(done)})
+        else:
+            offset = os.path.getsize(part) if os.path.isfile(part) else 0
+            self._reply(200, headers={"Upload-Complete": 0, "Upload-Offset": offset})
+
+    def do_PATCH(self):
+        body = self._begin()
+        if body is None:
+            return
+        sha, part, done = self._image_paths()
+        if sha is None:
+            self._reply(404, {"error": "not found"})
+            return
+        try:
+            offset = int(self.headers["Upload-Offset"])
+            total = int(self.headers["Upload-Length"])
+        except (KeyError, TypeError, ValueError):
+            self._reply(400, {"error": "Upload-Offset and Upload-Length required"})
+            return
+        name = _safe_name(self.headers.get("X-Name"), sha + ".jpg")
+        with self.server.lock:
+            if os.path.isfile(done):
+                self._reply(201, {"stored": name, "duplicate": True}, {"Upload-Offset": total})
+                return
+            current = os.path.getsize(part) if os.path.isfile(part) else 0
+            if offset != current or offset + len(body) > total:
+                self._reply(409, {"error": "offset mismatch"}, {"Upload-Offset": current})
+                return
+            with open(part, "ab") as f:
+                f.write(body)
+            received = current + len(body)
+            if received < total:
+                self._reply(204, headers={"Upload-Offset": received})
+                return
+            h = hashlib.sha256()
+            with open(part, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(block)
+            if h.hexdigest() != sha:
+                os.remove(part)
+                self._reply(422, {"error": "sha256 mismatch"}, {"Upload-Offset": 0})
+                return
+            images = os.path.join(self._station_dir(), "images")
+            os.makedirs(images, exist_ok=True)
+            dest = os.path.join(images, name)
+            if os.path.exists(dest):
+                dest = os.path.join(images, f"{sha[:12]}_{name}")
+            os.replace(part, dest)
+            # Keep a marker with the stored size so HEAD can report completion
+            with open(done, "wb") as f:
+                f.truncate(total)
+            self.server.images += 1
+        self._reply(201, {"stored": os.path.basename(dest)}, {"Upload-Offset": total})
+
+    # -------------------- Config --------------------
+    def _send_config(self):
+        station = _safe_name(self.headers.get("X-Station"), "default")
+        for path in (os.path.join(self.server.root, station, "config.json"),
+                     os.path.join(self.server.root, "config.json")):
+            if os.path.isfile(path):
+                break
+        else:
+            self._reply(404, {"error": "no config"})
+            return
+        with open(path, "rb") as f:
+            payload = f.read()
+        mtime = int(os.path.getmtime(path))
+        etag = '"' + hashlib.sha1(payload).hexdigest()[:16] + '"'
+        headers = {"ETag": etag, "Last-Modified": formatdate(mtime, usegmt=True)}
+        not_modified = False
+        if "If-None-Match" in self.headers:
+            not_modified = etag in [t.strip() for t in self.headers["If-None-Match"].split(",")]
+        elif "If-Modified-Since" in self.headers:
+            try:
+                not_modified = mtime <= parsedate_to_datetime(self.headers["If-Modified-Since"]).timestamp()
+            except (TypeError, ValueError):
+                pass
+        if not_modified:
+            self.server.config_304 += 1
+            self._reply(304, headers=headers)
+            return
+        self.server.config_200 += 1
+        self.send_response(200)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    # -------------------- Status --------------------
+    def do_GET(self):
+        if self._begin() is None:
+            return
+        if self.path == "/api/config":
+            self._send_config()
+        elif self.path == "/api/status":
+            self._reply(200, {"rows": self.server.rows, "batches": self.server.batches,
+                              "duplicates": self.server.duplicates, "images": self.server.images,
+                              "config_sent": self.server.config_200, "config_not_modified": self.server.config_304})
+        else:
+            self._reply(404, {"error": "not found"})
+
+
+class UploadServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, root, host="127.0.0.1", port=0, token=None, fail_rate=0.0, verbose=False):
+        super().__init__((host, port), UploadHandler)
+        self.root = root
+        self.token = token
+        self.fail_rate = fail_rate
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self._seen = {}     # station dir -> set of stored batch ids
+        self.rows = self.batches = self.duplicates = self.images = 0
+        self.config_200 = self.config_304 = 0
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _seen_batches(self, station_dir):
+        seen = self._seen.get(station_dir)
+        if seen is None:
+            seen = set()
+            try:
+                with open(os.path.join(station_dir, "batches.txt"), "r", encoding="utf-8") as f:
+                    seen = {line.strip() for line in f if line.strip()}
+            except OSError:
+                pass
+            self._seen[station_dir] = seen
+        return seen
+
+    def store_records(self, station_dir, lines):
+        by_batch = {}
+        for line in lines:
+            by_batch.setdefault(str(line.get("batch")), []).append(line)
+        accepted = duplicates = 0
+        with self.lock:
+            seen = self._seen_batches(station_dir)
+            new = [b for b in by_batch if b not in seen]
+            duplicates = len(by_batch) - len(new)
+            by_kind = {}
+            for batch in new:
+                for line in by_batch[batch]:
+                    by_kind.setdefault(_safe_name(line.get("kind"), "records"), []).append(line.get("row"))
+            records_dir = os.path.join(station_dir, "records")
+            os.makedirs(records_dir, exist_ok=True)
+            for kind, rows in by_kind.items():
+                with open(os.path.join(records_dir, kind + ".jsonl"), "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(row) + "\n" for row in rows)
+                accepted += len(rows)
+            # Batch ids are written last: a crash in between re-stores a batch rather than losing it
+            with open(os.path.join(station_dir, "batches.txt"), "a", encoding="utf-8") as f:
+                f.writelines(b + "\n" for b in new)
+            seen.update(new)
+            self.rows += accepted
+            self.batches += len(new)
+            self.duplicates += duplicates
+        return {"accepted": accepted, "batches": len(new), "duplicates": duplicates}
+
+
+def serve_in_thread(root, **kwargs):
+    """Start an UploadServer on a daemon thread (port 0 = any free port); return the server."""
+    server = UploadServer(root, **kwargs)
+    threading.Thread(target=server.serve_forever, name="upload-server", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the station upload server.")
+    parser.add_argument("--root", default="upload_root", help="Folder to store uploads in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--token", help="Require this bearer token")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests to drop")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+    server = UploadServer(args.root, args.host, args.port, args.token, args.fail_rate, args.verbose)
+    print(f"Upload server on {server.url}, storing in {os.path.abspath(args.root)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+Copy engine for USB export: a small thread pool copies several files at once through large
+reusable buffers, hashing each file (sha256) while it is copied and verifying it by reading
+the copy back from the drive. Progress is reported through throttled events (bytes, files, MB/s),
+e.g. to blink the LED, instead of one callback per file.
+
+copy_file_range/sendfile are not used: the data has to pass through user space to be hashed.
+"""
+import os
+import time
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+BUFFER_SIZE = 4 * 1024 * 1024   # per worker, reused for every file
+DEFAULT_WORKERS = 2             # USB sticks gain little from more parallel streams
+PROGRESS_INTERVAL = 0.25        # seconds between progress events
+
+
+class CopyStats:
+    """Running totals of a copy_many() call; passed to progress callbacks."""
+
+    def __init__(self, total_files=0, total_bytes=0):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files = 0
+        self.bytes = 0            # done, including resumed .part data
+        self.resumed_bytes = 0    # already on the drive from an earlier, interrupted copy
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def seconds(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def copied_bytes(self):
+        """Bytes actually copied in this run."""
+        return self.bytes - self.resumed_bytes
+
+    @property
+    def mb_per_s(self):
+        return self.copied_bytes / 1e6 / self.seconds if self.seconds > 0 else 0.0
+
+
+def _drop_cache(fd):
+    """Ask the kernel to forget cached pages so verification reads come from the USB drive."""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+
+
+class CopyEngine:
+    def __init__(self, workers=DEFAULT_WORKERS, buffer_size=BUFFER_SIZE, on_progress=None,
+                 progress_interval=PROGRESS_INTERVAL):
+        self.workers = max(1, workers)
+        self.buffer_size = buffer_size
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = None
+        self._last_event = 0.0
+
+    # -------------------- Buffers / progress --------------------
+    def _buffer(self):
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = memoryview(bytearray(self.buffer_size))
+        return buf
+
+    def _advance(self, n_bytes=0, n_files=0, resumed=0):
+        with self._lock:
+            self._stats.bytes += n_bytes + resumed
+            self._stats.resumed_bytes += resumed
+            self._stats.files += n_files
+            now = time.monotonic()
+            if self.on_progress is None or now - self._last_event < self.progress_interval:
+                return
+            self._last_event = now
+        try:
+            self.on_progress(self._stats)
+        except Exception:
+            pass  # feedback must never break the copy
+
+    def _hash_file(self, path, limit=None, h=None):
+        """Streaming sha256 of path (or its first `limit` bytes) through the worker buffer."""
+        h = h or hashlib.sha256()
+        buf = self._buffer()
+        remaining = limit
+        with open(path, "rb", buffering=0) as f:
+            while remaining is None or remaining > 0:
+                n = f.readinto(buf if remaining is None else buf[:min(len(buf), remaining)])
+                if not n:
+                    break
+                h.update(buf[:n])
+                if remaining is not None:
+                    remaining -= n
+        return h
+
+    # -------------------- Single file --------------------
+    def copy_file(self, src, dest):
+        """
+        Copy src to dest via dest + ".part", hashing the source while copying, then re-read the
+        destination and compare checksums. A leftover .part from a pulled USB is resumed if its
+        content matches the start of src. Return the sha256 hex digest.
+        """
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        part = dest + ".part"
+        h = hashlib.sha256()
+        offset = 0
+        if os.path.isfile(part):
+            part_size = os.path.getsize(part)
+            if 0 < part_size <= os.path.getsize(src):
+                prefix = self._hash_file(src, part_size)
+                if self._hash_file(part).digest() == prefix.digest():
+                    offset, h = part_size, prefix
+                    self._advance(resumed=offset)
+        buf = self._buffer()
+        with open(src, "rb", buffering=0) as fsrc, open(part, "r+b" if offset else "wb", buffering=0) as fdst:
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            fdst.truncate()
+            while True:
+                n = fsrc.readinto(buf)
+                if not n:
+                    break
+                chunk = buf[:n]
+                h.update(chunk)
+                written = 0
+                while written < n:
+                    written += fdst.write(chunk[written:])
+                self._advance(n)
+            os.fsync(fdst.fileno())
+            _drop_cache(fdst.fileno())
+        digest = h.hexdigest()
+        if self._hash_file(part).hexdigest() != digest:
+            os.remove(part)
+            raise IOError(f"Checksum mismatch for {os.path.basename(dest)}")
+        shutil.copystat(src, part)
+        os.replace(part, dest)
+        return digest
+
+    # -------------------- Many files --------------------
+    def copy_many(self, jobs, on_file_done=None):
+        """
+        Copy (src, dest) jobs on the worker pool. on_file_done(index, digest) is called in the
+        calling thread as each file is verified (in completion order). On the first error the
+        remaining jobs are cancelled and the error is raised. Return CopyStats.
+        """
+        total = 0
+        for src, _ in jobs:
+            try:
+                total += os.path.getsize(src)
+            except OSError:
+                pass
+        self._stats = CopyStats(len(jobs), total)
+        self._last_event = 0.0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="usb-copy") as pool:
+            futures = {pool.submit(self.copy_file, src, dest): i for i, (src, dest) in enumerate(jobs)}
+            try:
+                for future in as_completed(futures):
+                    digest = future.result()
+                    self._advance(n_files=1)
+                    if on_file_done:
+                        on_file_done(futures[future], digest)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        self._stats.finished = time.monotonic()
+        if self.on_progress:
+            try:
+                self.on_progress(self._stats)
+            except Exception:
+                pass  # the copy is done and verified; feedback must not turn it into an error
+        return self._stats
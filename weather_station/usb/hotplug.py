@@ -0,0 +1,169 @@
+"""
+USB drive detection from mount events instead of listing /media every few seconds.
+The kernel marks /proc/self/mountinfo readable-with-priority (POLLPRI) whenever anything is
+mounted or unmounted, so the main loop can sleep in poll() and react at once. Drives are
+identified by filesystem UUID (from /dev/disk/by-uuid) and report free space.
+Where mountinfo cannot be polled, get_usb_path() directory scanning is used instead.
+wake() ends a wait() early from another thread (e.g. when a new config arrives).
+"""
+import os
+import re
+import select
+import threading
+
+from .usb_transfer import get_usb_path
+
+MOUNTINFO = "/proc/self/mountinfo"
+BY_UUID = "/dev/disk/by-uuid"
+# Where desktop automounters (udisks) put removable drives
+MEDIA_PREFIXES = ("/media/", "/run/media/")
+
+
+class UsbDrive:
+    def __init__(self, mount_point, device=None, fs_type=None, uuid=None, read_only=False):
+        self.mount_point = mount_point
+        self.device = device
+        self.fs_type = fs_type
+        self.uuid = uuid
+        self.read_only = read_only
+
+    @property
+    def key(self):
+        """Stable identity: filesystem UUID, else device + mount point."""
+        return self.uuid or f"{self.device}:{self.mount_point}"
+
+    def free_bytes(self):
+        try:
+            st = os.statvfs(self.mount_point)
+        except OSError:
+            return None
+        return st.f_bavail * st.f_frsize
+
+    def describe(self):
+        free = self.free_bytes()
+        free_str = f"{free / 1e9:.1f} GB free" if free is not None else "free space unknown"
+        return f"{self.mount_point} (UUID {self.uuid or 'unknown'}, {self.fs_type or '?'}, {free_str})"
+
+
+def _unescape(field):
+    # mountinfo escapes space, tab, newline and backslash as octal (\040 etc.)
+    return re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), field)
+
+def _uuid_map(by_uuid=BY_UUID):
+    """Map device path (/dev/sda1) -> filesystem UUID."""
+    result = {}
+    try:
+        for uuid in os.listdir(by_uuid):
+            result[os.path.realpath(os.path.join(by_uuid, uuid))] = uuid
+    except OSError:
+        pass
+    return result
+
+def parse_mountinfo(text, uuids=None):
+    """Return UsbDrive for each block-device mount under /media or /run/media."""
+    uuids = uuids or {}
+    drives = []
+    for line in text.splitlines():
+        left, sep, right = line.partition(" - ")
+        if not sep:
+            continue
+        fields = left.split()
+        extra = right.split()
+        if len(fields) < 6 or len(extra) < 2:
+            continue
+        mount_point = _unescape(fields[4])
+        options = fields[5].split(",")
+        fs_type, source = extra[0], _unescape(extra[1])
+        if not source.startswith("/dev/") or not mount_point.startswith(MEDIA_PREFIXES):
+            continue
+        drives.append(UsbDrive(mount_point, source, fs_type, uuids.get(os.path.realpath(source)),
+                               read_only="ro" in options))
+    return drives
+
+
+class UsbWatcher:
+    """Track mounted USB drives; wait() sleeps until a mount change, wake() or the timeout."""
+
+    def __init__(self, mountinfo=MOUNTINFO, by_uuid=BY_UUID):
+        self.by_uuid = by_uuid
+        self._file = None
+        self._poller = None
+        self._wake_r = self._wake_w = None
+        self._woken = threading.Event()   # used instead of the pipe when scanning
+        try:
+            self._file = open(mountinfo, "r")
+            self._poller = select.poll()
+            self._poller.register(self._file, select.POLLPRI | select.POLLERR)
+            self._wake_r, self._wake_w = os.pipe()
+            os.set_blocking(self._wake_r, False)
+            os.set_blocking(self._wake_w, False)
+            self._poller.register(self._wake_r, select.POLLIN)
+        except (OSError, AttributeError):
+            # No mountinfo / poll (not Linux): fall back to scanning /media
+            self.close()
+        self._drives = None   # cached until the next mount change
+
+    @property
+    def event_based(self):
+        return self._poller is not None
+
+    def _read(self):
+        self._file.seek(0)
+        return parse_mountinfo(self._file.read(), _uuid_map(self.by_uuid))
+
+    def wait(self, timeout):
+        """Sleep up to timeout seconds; return True if mounts changed (always True when scanning)."""
+        if not self.event_based:
+            self._woken.wait(timeout)
+            self._woken.clear()
+            self._drives = None
+            return True
+        changed = False
+        for fd, _ in self._poller.poll(timeout * 1000):
+            if fd == self._wake_r:
+                try:
+                    while os.read(self._wake_r, 64):
+                        pass
+                except BlockingIOError:
+                    pass
+            else:
+                changed = True
+        if changed:
+            # Reading the file also clears the pending event
+            self._drives = [d for d in self._read() if not d.read_only]
+        return changed
+
+    def wake(self):
+        """Make a wait() in another thread return now."""
+        if self._wake_w is not None:
+            try:
+                os.write(self._wake_w, b"w")
+            except (BlockingIOError, OSError):
+                pass   # pipe full: a wake-up is already pending
+        else:
+            self._woken.set()
+
+    def drives(self):
+        """Currently mounted, writable USB drives."""
+        if self._drives is None:
+            if self.event_based:
+                self._drives = [d for d in self._read() if not d.read_only]
+            else:
+                path = get_usb_path()
+                self._drives = [UsbDrive(path)] if path else []
+        return self._drives
+
+    def current(self):
+        """First mounted USB drive, or None."""
+        drives = self.drives()
+        return drives[0] if drives else None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        for fd in (self._wake_r, self._wake_w):
+            if fd is not None:
+                os.close(fd)
+        self._file = None
+        self._poller = None
+        self._wake_r = self._wake_w = None
@@ -1,60 +1,171 @@
-import time
+"""
+Onboard LED feedback. Brightness files are opened once and written directly (no shell / sudo per
+change); blink patterns run on a background thread so capture and USB transfer are never blocked.
+If the brightness file cannot be opened for writing (not root, no udev rule) the old
+`sudo tee` path is used as fallback. Pass a different sysfs root (see make_fake_sysfs) to test
+on a normal Linux machine.
+"""
 import os
+import time
+import threading
+
+LEDS_ROOT = "/sys/class/leds"
+ACT = "ACT"   # Green ACT
+PWR = "PWR"   # Red PWR (used for copy failure)
+ACT_LED = os.path.join(LEDS_ROOT, ACT, "brightness")
+PWR_LED = os.path.join(LEDS_ROOT, PWR, "brightness")
+
+BLINK = 0.2
+# Patterns: list of (state, seconds) steps
+BLINK_3 = [(1, BLINK), (0, BLINK)] * 3
+
+
+class _SysfsLed:
+    """One LED brightness file, kept open."""
+
+    def __init__(self, path):
+        self.path = path
+        self.state = None
+        self._fd = None
+        self._sudo = False
+        try:
+            self._fd = os.open(path, os.O_WRONLY)
+        except PermissionError:
+            self._sudo = True
+
+    def write(self, state):
+        state = 1 if state else 0
+        if self._fd is not None:
+            try:
+                os.pwrite(self._fd, b"1" if state else b"0", 0)
+            except OSError:
+                return
+        elif self._sudo:
+            os.system(f"echo {state} | sudo tee {self.path} > /dev/null 2>&1")
+        self.state = state
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class LedController:
+    """Direct sysfs LED writes plus a non-blocking pattern player."""
+
+    def __init__(self, root=LEDS_ROOT):
+        self.root = root
+        self._leds = {}
+        for name in (ACT, PWR):
+            path = os.path.join(root, name, "brightness")
+            if os.path.exists(path):
+                self._leds[name] = _SysfsLed(path)
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._pattern = None       # (led name, steps) waiting to be played
+        self._generation = 0       # bumped to cancel the pattern being played
+        self._thread = None
+
+    def has(self, name):
+        return name in self._leds
+
+    def set(self, name, state):
+        """Set an LED now; cancels a running pattern."""
+        with self._lock:
+            self._generation += 1
+            self._pattern = None
+            self._wake.notify_all()
+            led = self._leds.get(name)
+            if led:
+                led.write(state)
+
+    def toggle(self, name):
+        """Flip an LED (busy indicator); a running pattern is left alone."""
+        with self._lock:
+            led = self._leds.get(name)
+            if led and self._pattern is None:
+                led.write(0 if led.state else 1)
+
+    def play(self, name, steps):
+        """Play steps [(state, seconds), ...] on the background thread; returns immediately."""
+        if name not in self._leds:
+            return
+        with self._lock:
+            self._generation += 1
+            self._pattern = (name, list(steps))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="led-patterns", daemon=True)
+                self._thread.start()
+            self._wake.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Block until no pattern is playing (for shutdown and tests)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._pattern is not None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._wake.wait(remaining)
+        return True
+
+    def _run(self):
+        with self._lock:
+            while True:
+                while self._pattern is None:
+                    self._wake.wait()
+                name, steps = self._pattern
+                generation = self._generation
+                for state, seconds in steps:
+                    if generation != self._generation:
+                        break
+                    self._leds[name].write(state)
+                    # Sleep without holding the lock; wake early if cancelled / replaced
+                    self._wake.wait(seconds)
+                if generation == self._generation:
+                    self._pattern = None
+                    self._wake.notify_all()
+
+    def close(self):
+        with self._lock:
+            self._generation += 1
+            self._pattern = None
+            self._wake.notify_all()
+            for led in self._leds.values():
+                led.close()
+
 
-ACT_LED = "/sys/class/leds/ACT/brightness"   # Green ACT
-PWR_LED = "/sys/class/leds/PWR/brightness"   # Red PWR (used for copy failure)
+def make_fake_sysfs(root, names=(ACT, PWR)):
+    """Create root/<name>/brightness files that LedController(root) can drive (for tests)."""
+    for name in names:
+        os.makedirs(os.path.join(root, name), exist_ok=True)
+        with open(os.path.join(root, name, "brightness"), "w") as f:
+            f.write("0")
+    return root
 
-def _on_pi():
-    return os.path.exists(os.path.dirname(ACT_LED))
 
-def _pwr_available():
-    return os.path.exists(os.path.dirname(PWR_LED))
+# -------------------- Module-level API (used by main.py and usb_transfer.py) --------------------
+_controller = None
 
-def _set_led(path, state):
-    if not os.path.exists(os.path.dirname(path)):
-        return
-    os.system(f"echo {state} | sudo tee {path} > /dev/null 2>&1")
+def get_controller():
+    global _controller
+    if _controller is None:
+        _controller = LedController()
+    return _controller
 
 def set_led(state):
     """Control green ACT LED (backwards compatibility)."""
-    if not _on_pi():
-        return
-    _set_led(ACT_LED, state)
+    get_controller().set(ACT, state)
 
 def led_success():
-    """Success: green LED flashes 3 times"""
-    if not _on_pi():
-        return
-    for _ in range(3):
-        _set_led(ACT_LED, 1)
-        time.sleep(0.2)
-        _set_led(ACT_LED, 0)
-        time.sleep(0.2)
+    """Success: green LED flashes 3 times (in the background)"""
+    get_controller().play(ACT, BLINK_3)
 
 def led_error():
-    """Failure: red LED flashes 3 times; if no PWR, use green"""
-    if _pwr_available():
-        for _ in range(3):
-            _set_led(PWR_LED, 1)
-            time.sleep(0.2)
-            _set_led(PWR_LED, 0)
-            time.sleep(0.2)
-    else:
-        # No red LED, fallback to green flashes
-        if _on_pi():
-            for _ in range(3):
-                _set_led(ACT_LED, 1)
-                time.sleep(0.2)
-                _set_led(ACT_LED, 0)
-                time.sleep(0.2)
+    """Failure: red LED flashes 3 times; if no PWR, use green (in the background)"""
+    controller = get_controller()
+    controller.play(PWR if controller.has(PWR) else ACT, BLINK_3)
 
 def led_busy_trigger():
-    if not _on_pi():
-        return
-    try:
-        with open(ACT_LED, "r") as f:
-            state = f.read().strip()
-        new_state = "0" if state in ("1", "255") else "1"
-        set_led(int(new_state))
-    except (OSError, ValueError):
-        set_led(1)
\ No newline at end of file
+    """Toggle green LED to show copy progress."""
+    get_controller().toggle(ACT)
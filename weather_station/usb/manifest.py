@@ -0,0 +1,87 @@
+"""
+Export manifest: remembers which local files have already been copied to USB (size, mtime, sha256),
+so each insertion only copies new or changed files.
+Stored as append-only JSON lines next to data/; a torn last line after power loss is ignored.
+"""
+import os
+import json
+from datetime import datetime
+
+# Rewrite the file once it holds this many more lines than live entries
+COMPACT_SLACK = 500
+
+
+class ExportManifest:
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lines = 0
+        self.load()
+
+    def load(self):
+        self.entries = {}
+        self._lines = 0
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                self._lines += 1
+                try:
+                    entry = json.loads(line)
+                    self.entries[entry["file"]] = entry
+                except (ValueError, KeyError, TypeError):
+                    continue  # torn or corrupt line
+
+    def is_exported(self, rel_path, st):
+        """True if rel_path was exported and is unchanged since (same size and mtime)."""
+        entry = self.entries.get(rel_path)
+        return (entry is not None and entry.get("size") == st.st_size
+                and entry.get("mtime_ns") == st.st_mtime_ns)
+
+    def record(self, rel_path, st, sha256, target):
+        """Append one exported file and fsync, so a pulled USB / power cut keeps earlier progress."""
+        entry = {
+            "file": rel_path,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": sha256,
+            "target": target,
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self._append(entry)
+
+    def keep_exported(self, rel_path, st, reason):
+        """
+        After a deliberate local rewrite of an exported file (e.g. recompression to save space),
+        record its new size/mtime so it is not exported again. The sha256 stays that of the export.
+        """
+        entry = self.entries.get(rel_path)
+        if entry is None:
+            return False
+        self._append(dict(entry, size=st.st_size, mtime_ns=st.st_mtime_ns, local=reason))
+        return True
+
+    def _append(self, entry):
+        self.entries[entry["file"]] = entry
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._lines += 1
+
+    def prune(self, root):
+        """Drop entries whose local file no longer exists under root; compact the file if worthwhile."""
+        for rel_path in [p for p in self.entries if not os.path.isfile(os.path.join(root, p))]:
+            del self.entries[rel_path]
+        if self._lines - len(self.entries) > COMPACT_SLACK:
+            self._compact()
+
+    def _compact(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._lines = len(self.entries)
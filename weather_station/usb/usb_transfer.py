@@ -1,12 +1,19 @@
 """
 USB copy and cleanup: copy data to USB drive without WiFi, delete local data after successful copy.
-Show success/failure via LED and STATUS.txt in USB root.
+Only files not yet exported are copied (see manifest.py); an interrupted copy resumes on the next insertion.
 Copy result shown via LED and STATUS.txt in USB root (success/failure).
 """
 import os
 import shutil
 from datetime import datetime
 from .led_feedback import led_busy_trigger
+from .manifest import ExportManifest
+from .copy_engine import CopyEngine, DEFAULT_WORKERS
+
+# Toggle the busy LED at most this often while copying (driven by copy progress, not per file)
+LED_BLINK_INTERVAL = 0.5
+# Marker in USB root naming the export folder of a transfer that has not finished yet
+RESUME_MARKER = ".orchard_transfer_in_progress"
 
 # Common Raspberry Pi USB mount points (user copies data via USB when no WiFi)
 def _usb_base_paths():
@@ -44,11 +51,6 @@ def sync_usb_config(usb_path, local_config_path):
             return False
     return False
 
-def _count_files(folder):
-    if not os.path.isdir(folder):
-        return 0
-    return sum(1 for _ in os.listdir(folder) if os.path.isfile(os.path.join(folder, _)))
-
 def _write_status(usb_path, success, message):
     """Write STATUS.txt in USB root for user to see success/failure after copy"""
     path = os.path.join(usb_path, "STATUS.txt")
@@ -61,17 +63,51 @@ def _write_status(usb_path, success, message):
     except Exception:
         pass
 
-def _copy_file(src, dest_path, led_trigger=None):
-    """Copy single file to target path, ensure target directory exists"""
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-    shutil.copy2(src, dest_path)
-    if led_trigger:
-        led_trigger()
+def _pending_files(manifest, data_dir, image_dir, config_file, system_log):
+    """List (rel_path, src, stat) of files that are new or changed since their last export."""
+    sources = []
+    for prefix, folder in (("data", data_dir), ("images", image_dir)):
+        if os.path.isdir(folder):
+            for name in sorted(os.listdir(folder)):
+                sources.append((f"{prefix}/{name}", os.path.join(folder, name)))
+    # log.txt and config.json at the top of the export folder (for easy viewing on computer)
+    if system_log:
+        sources.append(("log.txt", system_log))
+    if config_file:
+        sources.append(("config.json", config_file))
+    pending = []
+    for rel, src in sources:
+        if not os.path.isfile(src):
+            continue
+        st = os.stat(src)
+        if not manifest.is_exported(rel, st):
+            pending.append((rel, src, st))
+    return pending
+
+def _remove_exported(manifest, local_root):
+    """Delete data/images files on the Pi that are already exported and unchanged since; return count."""
+    removed = 0
+    for rel in list(manifest.entries):
+        if not (rel.startswith("data/") or rel.startswith("images/")):
+            continue
+        path = os.path.join(local_root, *rel.split("/"))
+        try:
+            if manifest.is_exported(rel, os.stat(path)):
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
 
-def transfer_and_clean(usb_path, data_dir, image_dir, config_file=None, system_log=None):
+def transfer_and_clean(usb_path, data_dir, image_dir, config_file=None, system_log=None,
+                       manifest_path=None, clean=True, workers=DEFAULT_WORKERS):
     """
-    Copy data, images, and (if provided) config.json, log.txt to USB target path,
-    then delete files in data/images on Pi after successful verification.
+    Copy data, images, and (if provided) config.json, log.txt that were not exported before
+    into orchard_data_<timestamp>/ on the USB drive (several files at once, see copy_engine.py),
+    verifying each file by sha256.
+    Each file is recorded in the export manifest as soon as it is verified, so pulling the USB
+    only loses the file in flight. With clean=True, exported data/images files are then
+    deleted on the Pi (unless they changed since they were copied).
     Use provided usb_path to ensure writes to correct device.
     Return (success, message).
     """
@@ -87,63 +123,82 @@ def transfer_and_clean(usb_path, data_dir, image_dir, config_file=None, system_l
     except Exception as e:
         return False, f"USB is not writable: {e}"
 
+    if manifest_path is None:
+        manifest_path = os.path.join(os.path.dirname(os.path.abspath(data_dir)), "export_manifest.jsonl")
+    local_root = os.path.dirname(os.path.abspath(data_dir))
+    manifest = ExportManifest(manifest_path)
+    manifest.prune(local_root)
+
+    pending = _pending_files(manifest, data_dir, image_dir, config_file, system_log)
+    n_data = sum(1 for rel, _, _ in pending if rel.startswith("data/"))
+    n_images = sum(1 for rel, _, _ in pending if rel.startswith("images/"))
+    if not n_data and not n_images:
+        msg = "No new data or images since the last export."
+        if clean:
+            msg += f" Removed {_remove_exported(manifest, local_root)} exported files from the Pi."
+        _write_status(usb_path, True, msg)
+        return True, msg
+
+    # Check free space up front instead of failing half-way through
+    needed = sum(st.st_size for _, _, st in pending)
+    try:
+        st_usb = os.statvfs(usb_path)
+        free = st_usb.f_bavail * st_usb.f_frsize
+    except (OSError, AttributeError):
+        free = None
+    if free is not None and free < needed:
+        msg = f"Not enough space on USB: need {needed / 1e6:.1f} MB, {free / 1e6:.1f} MB free"
+        _write_status(usb_path, False, msg)
+        return False, msg
+
+    # Resume the unfinished export folder on this drive, if any
+    marker = os.path.join(usb_path, RESUME_MARKER)
+    target_name = None
+    if os.path.isfile(marker):
+        with open(marker, "r", encoding="utf-8") as f:
+            target_name = f.read().strip() or None
+        if target_name and not os.path.isdir(os.path.join(usb_path, target_name)):
+            target_name = None
+    resumed = target_name is not None
     timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-    target_folder = os.path.join(usb_path, f"orchard_data_{timestamp}")
+    if target_name is None:
+        target_name = f"orchard_data_{timestamp}"
+    target_folder = os.path.join(usb_path, target_name)
     report_path = os.path.join(usb_path, f"REPORT_{timestamp}.txt")
 
-    n_data = _count_files(data_dir)
-    n_images = _count_files(image_dir)
-
+    copied = 0
     try:
-        os.makedirs(target_folder, exist_ok=True)
-        dest_data = os.path.join(target_folder, "data")
-        dest_images = os.path.join(target_folder, "images")
-        os.makedirs(dest_data, exist_ok=True)
-        os.makedirs(dest_images, exist_ok=True)
-
-        # 1) Copy all files in data directory
-        for f in os.listdir(data_dir):
-            src = os.path.join(data_dir, f)
-            if os.path.isfile(src):
-                dest = os.path.join(dest_data, f)
-                shutil.copy2(src, dest)
-                led_busy_trigger()
-
-        # 2) Copy all files in images directory
-        for f in os.listdir(image_dir):
-            src = os.path.join(image_dir, f)
-            if os.path.isfile(src):
-                dest = os.path.join(dest_images, f)
-                shutil.copy2(src, dest)
-                led_busy_trigger()
-
-        # 3) Copy log.txt and config.json (for easy viewing on computer)
-        if system_log and os.path.isfile(system_log):
-            shutil.copy2(system_log, os.path.join(target_folder, "log.txt"))
-            led_busy_trigger()
-        if config_file and os.path.isfile(config_file):
-            shutil.copy2(config_file, os.path.join(target_folder, "config.json"))
-            led_busy_trigger()
-
-        # Ensure writes are committed to USB before verification
+        os.makedirs(os.path.join(target_folder, "data"), exist_ok=True)
+        os.makedirs(os.path.join(target_folder, "images"), exist_ok=True)
+        with open(marker, "w", encoding="utf-8") as f:
+            f.write(target_name)
+
+        def file_done(index, digest):
+            nonlocal copied
+            rel, _, st = pending[index]
+            manifest.record(rel, st, digest, target_name)
+            with open(os.path.join(target_folder, "checksums.sha256"), "a", encoding="utf-8") as f:
+                f.write(f"{digest}  {rel}\n")
+            copied += 1
+
+        engine = CopyEngine(workers=workers, on_progress=lambda stats: led_busy_trigger(),
+                            progress_interval=LED_BLINK_INTERVAL)
+        jobs = [(src, os.path.join(target_folder, *rel.split("/"))) for rel, src, _ in pending]
+        stats = engine.copy_many(jobs, on_file_done=file_done)
+
         if hasattr(os, "sync"):
             os.sync()
-
-        # Verify: only delete local files if data/images counts match
-        n_data_dest = _count_files(dest_data)
-        n_images_dest = _count_files(dest_images)
-        if n_data_dest != n_data or n_images_dest != n_images:
-            _write_status(usb_path, False, f"Verification failed: data {n_data_dest}/{n_data}, images {n_images_dest}/{n_images}")
-            return False, "Verification failed, local data not deleted"
-
-        # Verification passed, delete files in data/images on Pi
-        for folder in [data_dir, image_dir]:
-            for f in os.listdir(folder):
-                fp = os.path.join(folder, f)
-                if os.path.isfile(fp):
-                    os.remove(fp)
-
-        msg = f"Copied {n_data} data files, {n_images} image files; backed up log.txt and config.json. Local data/images cleared."
+        os.remove(marker)
+        # Verified on USB: delete on Pi unless written to while copying (e.g. climate log)
+        if clean:
+            removed = _remove_exported(manifest, local_root)
+
+        msg = (f"Copied {n_data} data files, {n_images} image files ({stats.copied_bytes / 1e6:.1f} MB "
+               f"at {stats.mb_per_s:.1f} MB/s"
+               + (f", {stats.resumed_bytes / 1e6:.1f} MB already on the drive" if stats.resumed_bytes else "")
+               + f", sha256 verified) to {target_name}{' (resumed)' if resumed else ''}.")
+        if clean:
+            msg += f" Removed {removed} exported files from the Pi."
         with open(report_path, "w", encoding="utf-8") as r:
             r.write(f"Transfer Successful\nTime: {datetime.now()}\n{msg}\n")
         _write_status(usb_path, True, msg)
@@ -152,7 +207,7 @@ def transfer_and_clean(usb_path, data_dir, image_dir, config_file=None, system_l
         return True, msg
 
     except Exception as e:
-        err_msg = str(e)
+        err_msg = f"{e} ({copied}/{len(pending)} files copied; will resume on next insertion)"
         try:
             with open(report_path, "w", encoding="utf-8") as r:
                 r.write(f"Transfer Failed\nError: {err_msg}\n")